@@ -9,6 +9,29 @@ DATA_DIR = SRC_DIR / "data_box"
 PATH_CSV_SUPPLIERS = DATA_DIR / "data_suppliers.csv"
 PATH_CSV_CLIENTS = DATA_DIR / "data_clients.csv"
 PATH_YEAR = CONFIG_DIR / "year.csv"
+PATH_DB = DATA_DIR / "scadenzade.db"
+PATH_SUMMARY = DATA_DIR / "summary.json"
+PATH_MANIFEST_SUPPLIERS = DATA_DIR / "manifest_suppliers.json"
+PATH_MANIFEST_CLIENTS = DATA_DIR / "manifest_clients.json"
+PATH_DEADLINE_OVERRIDES = DATA_DIR / "deadline_overrides.csv"
+
+# numero di processi per la lettura delle fatture XML: 0 = tutti i core
+# disponibili, 1 = lettura sequenziale
+XML_WORKERS = 0
+
+# file letti nelle directory delle fatture (anche nelle sottodirectory):
+# modelli di nome file, senza distinzione tra maiuscole e minuscole. I modelli
+# di esclusione valgono anche per le directory
+XML_INCLUDE = ("*.xml", "*.zip")
+XML_EXCLUDE = ()
+
+# modalità watch: legge in background le fatture che arrivano nelle directory
+# (attivabile anche con "scadenzade --watch")
+WATCH_FOLDERS = False
+
+# anni caricati in background oltre a quello attivo (prima anno ±1, poi gli
+# altri anni disponibili); è anche il numero massimo di anni tenuti in memoria
+PREFETCH_YEARS = 4
 
 # constant for listboxes generation
 SCAD_LIST_HEAD = [("Calcolo", 'left'), ("Gennaio", 'right'), ("Febbraio", 'right'),
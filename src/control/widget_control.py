@@ -1,7 +1,14 @@
+import os
+import queue
 from datetime import datetime
-from models.scadenz import ScadDati
+from functools import partial
+from models.scadenz import ScadDati, IngestCancelled
+from models.ingest_job import IngestJob
 from models.data_provider import DataProvider
-from config.constants import PATH_CSV_SUPPLIERS, PATH_CSV_CLIENTS
+from models.watcher import FolderWatcher
+from models.prefetch import YearPrefetcher
+from config.constants import PATH_CSV_SUPPLIERS, PATH_CSV_CLIENTS, PATH_DB
+from config.constants import PATH_MANIFEST_SUPPLIERS, PATH_MANIFEST_CLIENTS, PATH_DEADLINE_OVERRIDES
 
 class AccountInvoices:
     """
@@ -11,27 +18,54 @@ class AccountInvoices:
     def __init__(self):
         pass
 
-    def make_csv(self, start_path):
+    def make_csv(self, start_path, progress=None, cancel=None, log=print):
+        # start_path: [fornitori, clienti], ognuno un percorso o una lista di percorsi
+        # progress(lato, fatti, totale, errori), cancel (threading.Event) e log
+        # (messaggi della lettura) per la contabilizzazione in background
+        # (IngestJob), che non deve scrivere sullo schermo: nulla viene scritto
+        # finché entrambi i lati non sono letti, così un annullamento non
+        # lascia file, archivio o riepilogo a metà
         try:
             scadenzclass = ScadDati(start_path[0])
-            scadenzclass.read_xml()
-            scadenzclass.xml_to_csv(PATH_CSV_SUPPLIERS)
-            years_deadlines_suppliers = scadenzclass.sniff_years() # legge gli anni delle scadenze fatture fornitori
+            # un solo passaggio per lato: righe CSV, anni delle scadenze e conteggi
+            summary_suppliers = scadenzclass.ingest(
+                PATH_CSV_SUPPLIERS, PATH_MANIFEST_SUPPLIERS, PATH_DEADLINE_OVERRIDES,
+                progress=partial(progress, "Fornitori") if progress else None,
+                cancel=cancel, save=False, log=log
+            )
+            rows_suppliers = scadenzclass.rows
 
             scadenzclass.change_file(start_path[1])
-            scadenzclass.read_xml()
-            scadenzclass.xml_to_csv(PATH_CSV_CLIENTS)
-            years_deadlines_client = scadenzclass.sniff_years() # legge gli anni delle scadenze fatture clienti
-            
+            summary_clients = scadenzclass.ingest(
+                PATH_CSV_CLIENTS, PATH_MANIFEST_CLIENTS, PATH_DEADLINE_OVERRIDES,
+                progress=partial(progress, "Clienti") if progress else None,
+                cancel=cancel, save=False, log=log
+            )
+            rows_clients = scadenzclass.rows
+            if cancel is not None and cancel.is_set():
+                raise IngestCancelled()
+
+            # da qui non si annulla più: manifest, scadenze aggiunte, CSV e archivio
+            if progress:
+                progress("Salvataggio", 0, 0, summary_suppliers["errors"] + summary_clients["errors"])
+            scadenzclass.commit()
+            data_provider = DataProvider()
+            data_provider.import_rows("suppliers", rows_suppliers, log)
+            data_provider.import_rows("clients", rows_clients, log)
+
             # trova dalle fatture gli anni delle scadenze e le mette negli anni disponibili in years.csv
-            merge_years = [years_deadlines_suppliers, years_deadlines_client]
-            flat_list = [year for sublist in merge_years for year in sublist]
-            list_years = sorted(set(flat_list))
-            scadenzclass.write_years_csv(datetime.now().year, list_years)
+            list_years = sorted(set(summary_suppliers["years"]) | set(summary_clients["years"]))
+            scadenzclass.write_years_csv(datetime.now().year, list_years, log)
+            # righe, totali e anni in cache non sono più validi
+            DataProvider.invalidate()
             return True
-            
+
+        except IngestCancelled:
+            # scritture rimandate (manifest, scadenze aggiunte, CSV) scartate
+            scadenzclass.discard()
+            raise
         except Exception as e:
-            print(f"Errore durante la contabilizzazione: {e}")
+            log(f"Errore durante la contabilizzazione: {e}")
             return False
 
 class Event:
@@ -72,12 +106,12 @@ class ControllerW:
         for listener in listeners:
             listener(event)
 
-    def make_invoices(self, start_path, sorgente_widget):
-        result = self.account_invoices.make_csv(start_path)
-        tipology = "Info" if result else "Warning"
-        message = "Elaborazione terminata con successo" if result else "Elaborazione non riuscita"        
-        event = Event("text-statusbar", sorgente_widget, {tipology: message})
-        self.emit_event(event)
+    def reload_data(self, source=None):
+        """
+        Ask the interface to load the data written by an ingestion, keeping
+        year, month and selection (see MainView.reload_data).
+        """
+        self.emit_event(Event("dati_aggiornati", source))
         
     def get_start_paths(self):
         try:
@@ -92,6 +126,99 @@ class ControllerW:
             print(f"Errore nel controller: {e}")
             return ["", ""]
 
+    def get_source_roots(self):
+        # tutti i percorsi delle fatture: [percorsi fornitori, percorsi clienti]
+        try:
+            path_dict = self.data_provider.get_csv_path()
+            return [path_dict.get("suppliers", []), path_dict.get("clients", [])]
+        except Exception as e:
+            print(f"Errore nel controller: {e}")
+            return [[], []]
+
+    def _ui_callback(self, loop, callback):
+        """
+        Return a function that a background thread can call with any
+        arguments: the calls are queued and callback runs with the same
+        arguments inside the urwid loop, woken up through a pipe
+        (MainLoop.watch_pipe). If callback returns False it was the last
+        call: urwid removes the watch and closes the read end, the write
+        end is closed here.
+        """
+        pending = queue.Queue()
+
+        def on_pipe(data):
+            while True:
+                try:
+                    args = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if callback(*args) is False:
+                    os.close(pipe_fd)
+                    return False
+            return True  # mantiene aperta la pipe
+
+        pipe_fd = loop.watch_pipe(on_pipe)
+
+        def notify(*args):
+            # chiamata dal thread in background
+            pending.put(args)
+            os.write(pipe_fd, b"\n")
+
+        return notify
+
+    def start_watch(self, loop, on_rows, on_error):
+        """
+        Start watching the invoice directories. New deadlines are read in a
+        background thread and passed to on_rows(side, rows, replaced) inside
+        the urwid loop (replaced: rows of rewritten invoices), so the
+        interface never waits for the parsing; the files that
+        cannot be read are reported with on_error(message), also in the loop.
+        """
+        def dispatch(kind, *args):
+            if kind == "rows":
+                on_rows(*args)
+            else:
+                on_error(*args)
+
+        notify = self._ui_callback(loop, dispatch)
+        suppliers, clients = self.get_source_roots()
+        watcher = FolderWatcher(
+            {"suppliers": suppliers, "clients": clients}, partial(notify, "rows"),
+            {"suppliers": PATH_MANIFEST_SUPPLIERS, "clients": PATH_MANIFEST_CLIENTS},
+            PATH_DEADLINE_OVERRIDES, on_error=partial(notify, "error")
+        )
+        watcher.start()
+        return watcher
+
+    def start_prefetch(self, loop, on_index):
+        """
+        Start the thread that loads in background the years next to the
+        active one; every DeadlineIndex is passed to on_index(side, year,
+        index, version) inside the urwid loop.
+        """
+        prefetcher = YearPrefetcher(PATH_DB, self._ui_callback(loop, on_index))
+        prefetcher.start()
+        return prefetcher
+
+    def start_ingest(self, loop, start_path, on_progress, on_done):
+        """
+        Start the ingestion of the invoices in start_path ([fornitori,
+        clienti]) in a background thread. on_progress(IngestProgress) and
+        on_done(result, cancelled, messages) run inside the urwid loop, so
+        the interface keeps working; the returned IngestJob has cancel().
+        """
+        def dispatch(kind, *args):
+            if kind == "done":
+                on_done(*args)
+                return False  # ultima notifica: chiude la pipe
+            on_progress(*args)
+
+        notify = self._ui_callback(loop, dispatch)
+        job = IngestJob(partial(self.account_invoices.make_csv, start_path),
+                        partial(notify, "progress"), partial(notify, "done"))
+        job.start()
+        return job
+
     def set_start_paths(self, path):
         return self.data_provider.set_csv_path(path)
         
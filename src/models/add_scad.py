@@ -6,7 +6,7 @@
 # date ............... 14-08-2025
 # version ............ 0.6.0
 
-def add_scad(dett_doc, dett_ana, manual_scad=False, data_manual=None):
+def add_scad(dett_doc, dett_ana, manual_scad=False, data_manual=None, verbose=True):
     """
     Gestisce l'aggiunta manuale della data di scadenza nel file XML.
     Da tracciato "DataScadenzaPagamento" non è obbligatorio, quindi se non presente
@@ -26,6 +26,8 @@ def add_scad(dett_doc, dett_ana, manual_scad=False, data_manual=None):
     - dett_ana (dict): Dati anagrafici del cliente. Deve contenere 'Denominazione'.
     - manual_scad (bool): Se True, si usa la data passata in `data_manual`.
     - data_manual (str): Data di scadenza manuale già validata (formato 'yyyy-mm-dd').
+    - verbose (bool): Se False non stampa gli avvisi (usato durante la contabilizzazione,
+      che riporta solo il numero di scadenze aggiunte).
 
     Ritorna:
     - str: Data di scadenza da scrivere nel tracciato XML.
@@ -51,7 +53,8 @@ def add_scad(dett_doc, dett_ana, manual_scad=False, data_manual=None):
             f"di {dett_ana.get('Denominazione')} non contiene la data di scadenza e non è stata "
             "impostata manualmente.\n"
         )
-        print(warning_base + warning_text)
+        if verbose:
+            print(warning_base + warning_text)
         return None
     elif manual_scad == False:
         warning_text = (
@@ -60,5 +63,6 @@ def add_scad(dett_doc, dett_ana, manual_scad=False, data_manual=None):
             f"Sarà considerata come scadenza la data della fattura."
         )
         data = dett_doc.get('Data', '1970-01-01')
-    print(warning_base + warning_text)
+    if verbose:
+        print(warning_base + warning_text)
     return data
\ No newline at end of file
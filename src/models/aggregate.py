@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+# file name .......... aggregate.py
+# scope .............. monthly totals of the deadlines, for all years, and
+# .................... totals by counterparty, calculated with a single pass
+# .................... over the rows
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+from array import array
+from collections import Counter
+import models.datecodec as datecodec
+from models.amounts import to_cents, format_cents, group_sums
+
+class MonthlyTotals:
+    '''
+    Totals of the deadlines grouped by (year, month), in integer cents. The
+    rows are read once into two array('q') buffers (yyyymm of the deadline and
+    cents) that are summed in a batched pass (amounts.group_sums, vectorized
+    with numpy if installed), so the totals of any year are then available
+    without reading the rows again and without float rounding errors.
+    rows are dicts from the CSV files (default keys) or tuples from
+    clifor_row (date_key=2, amount_key=1). Dates are "dd-mm-yyyy" strings
+    or yyyymmdd codes (datecodec).
+    '''
+
+    def __init__(self, rows=(), date_key="DataScadenzaPagamento", amount_key="ImportoPagamento"):
+        self.date_key = date_key
+        self.amount_key = amount_key
+        self.totals = {}     # anno -> lista di 12 totali in centesimi
+        self.counts = {}     # anno -> lista di 12 numeri di scadenze
+        self.skipped = 0     # righe con data o importo non validi
+        self.add(rows)
+
+    @classmethod
+    def from_sums(cls, sums):
+        """
+        Build the totals from (year, month, cents, count) already grouped
+        (e.g. by SQL).
+        """
+        totals = cls()
+        for year, month, cents, count in sums:
+            totals.totals.setdefault(year, [0] * 12)[month - 1] += cents or 0
+            totals.counts.setdefault(year, [0] * 12)[month - 1] += count or 0
+        return totals
+
+    @classmethod
+    def from_dict(cls, data):
+        """Totals saved by to_dict: {"anno": {"cents": [...], "rows": [...]}}."""
+        totals = cls()
+        for year, months in data.items():
+            totals.totals[int(year)] = [int(cents) for cents in months["cents"]]
+            totals.counts[int(year)] = [int(count) for count in months["rows"]]
+        return totals
+
+    def to_dict(self):
+        return {str(year): {"cents": self.totals[year], "rows": self.counts.get(year, [0] * 12)}
+                for year in self.years()}
+
+    def merge(self, other, sign=1):
+        """Add (sign=-1: subtract) the totals of other (another MonthlyTotals). Return self."""
+        for year, months in other.totals.items():
+            mine = self.totals.setdefault(year, [0] * 12)
+            counts = self.counts.setdefault(year, [0] * 12)
+            for i, (cents, count) in enumerate(zip(months, other.counts.get(year, [0] * 12))):
+                mine[i] += sign * cents
+                counts[i] += sign * count
+        return self
+
+    def add(self, rows):
+        """Add rows to the totals (one pass over rows, one over the buffers). Return self."""
+        date_key, amount_key = self.date_key, self.amount_key
+        code = datecodec.code
+        months = array("q")
+        cents = array("q")
+        for row in rows:
+            try:
+                scadenza = code(row[date_key])
+                amount = to_cents(row[amount_key])
+            except (ValueError, TypeError, AttributeError, KeyError, IndexError):
+                self.skipped += 1
+                continue
+            if not scadenza:
+                self.skipped += 1
+                continue
+            months.append(scadenza // 100)
+            cents.append(amount)
+        return self.add_columns(months, cents)
+
+    def add_columns(self, months, cents):
+        """Add buffers already decoded: yyyymm of the deadlines and cents. Return self."""
+        for year_month, total in group_sums(months, cents).items():
+            year, month = divmod(year_month, 100)
+            self.totals.setdefault(year, [0] * 12)[month - 1] += total
+        for year_month, count in Counter(months).items():
+            year, month = divmod(year_month, 100)
+            self.counts.setdefault(year, [0] * 12)[month - 1] += count
+        return self
+
+    def years(self):
+        """Years with at least one deadline, in order."""
+        return sorted(self.totals)
+
+    def cents(self, year):
+        """The 12 monthly totals of year in cents (zeros for unknown years)."""
+        return list(self.totals.get(year, [0] * 12))
+
+    def year(self, year):
+        """The 12 monthly totals of year, formatted like the CSV ("0.00")."""
+        return [format_cents(total) for total in self.cents(year)]
+
+def totals_by(rows, key_col, amount_col=1):
+    """
+    Totals in cents of rows grouped by the value of column key_col (e.g. the
+    counterparty: 0 for suppliers, 8 for clients in the rows of
+    clifor_row), summed in one batched pass (amounts.group_sums).
+    Rows with an invalid amount are skipped. Return {key: cents}.
+    """
+    keys = []
+    cents = array("q")
+    for row in rows:
+        try:
+            amount = to_cents(row[amount_col])
+        except (ValueError, TypeError, AttributeError):
+            continue
+        keys.append(row[key_col])
+        cents.append(amount)
+    return group_sums(keys, cents)
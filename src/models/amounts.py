@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# file name .......... amounts.py
+# scope .............. amounts as integer cents: exact parsing and formatting,
+# .................... and totals grouped by key over array('q') buffers
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy as np  # opzionale: somme vettoriali sui buffer
+except ImportError:
+    np = None
+
+# sotto questa dimensione il ciclo Python è più veloce della conversione numpy
+NUMPY_MIN_ROWS = 5000
+
+@lru_cache(maxsize=65536)
+def _parse(text):
+    sign = 1
+    if text and text[0] in "+-":
+        sign = -1 if text[0] == "-" else 1
+        text = text[1:]
+    units, _, decimals = text.partition(".")
+    if not (units or decimals) or not (units + decimals).isdigit():
+        raise ValueError(f"importo non valido: {text!r}")
+    # arrotondamento al centesimo (metà per eccesso) senza passare dai float
+    cents = int(units or "0") * 100 + int((decimals + "00")[:2])
+    if decimals[2:3] >= "5":
+        cents += 1
+    return sign * cents
+
+def to_cents(value):
+    """Amount ("1234.56", int cents are returned as they are) -> int cents."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return round(value * 100)
+    dot = value.find(".")
+    if (dot == -1 or len(value) - dot <= 3) and "," not in value:
+        try:
+            # al più due decimali: float esatto dopo l'arrotondamento al centesimo
+            # (fino a 10^13 euro), molto più veloce dell'analisi della stringa
+            return round(float(value) * 100)
+        except (ValueError, OverflowError):
+            pass
+    return _parse(value.strip().replace(",", "."))
+
+def format_cents(cents):
+    """int cents -> "1234.56", the format of the CSV files."""
+    sign = "-" if cents < 0 else ""
+    units, cents = divmod(abs(cents), 100)
+    return f"{sign}{units}.{cents:02d}"
+
+def group_sums(keys, cents):
+    """
+    Sum cents (array('q') or list) by keys (same length, integers or any
+    hashable). Return {key: total cents}. With numpy installed and integer
+    keys, big buffers are summed in a vectorized pass (exact, int64).
+    """
+    if np is not None and len(keys) >= NUMPY_MIN_ROWS and isinstance(keys, array):
+        key_values, inverse = np.unique(np.frombuffer(keys, dtype=np.int64), return_inverse=True)
+        sums = np.zeros(len(key_values), dtype=np.int64)
+        np.add.at(sums, inverse, np.frombuffer(cents, dtype=np.int64))
+        return dict(zip(key_values.tolist(), sums.tolist()))
+    totals = {}
+    get = totals.get
+    for key, amount in zip(keys, cents):
+        totals[key] = get(key, 0) + amount
+    return totals
@@ -6,10 +6,28 @@
 # date ............... 14-08-2025
 # version ............ 0.6.0
 
-from models import scadenz
+from models.aggregate import MonthlyTotals
+from models.amounts import format_cents
+from models.deadline_table import DeadlineTable
 import models.readwrite_csv_xml as rwcsvxml
+import models.datecodec as datecodec
+import os
+import sqlite3
 import traceback
-from config.constants import PATH_CSV_SUPPLIERS, PATH_CSV_CLIENTS
+from models.invoice_store import InvoiceStore, CSV_TO_STORE
+from models.summary import DeadlineSummary
+from config.constants import PATH_CSV_SUPPLIERS, PATH_CSV_CLIENTS, PATH_DB, PATH_YEAR, PATH_SUMMARY
+
+# file CSV di ogni lato, importati nell'archivio alla prima apertura
+CSV_BY_SIDE = {"suppliers": PATH_CSV_SUPPLIERS, "clients": PATH_CSV_CLIENTS}
+
+def _file_stamp(path):
+    # (percorso, mtime, dimensione): cambia quando il file viene riscritto
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (str(path), None, None)
+    return (str(path), stat.st_mtime_ns, stat.st_size)
 
 class DataProvider():
     '''
@@ -17,17 +35,58 @@ class DataProvider():
     In MVC is model. From this class recall other functions inside in other 
     files like: add_scad.py, read_csv_xml.py, scadenz.py. 
     All in "models" directory.
+    Deadlines are read through the SQLite archive (invoice_store.py); the
+    first time it is created, it is filled with the existing CSV files.
+    Rows are loaded one year at a time, only when the lists are shown: the
+    monthly totals of all years come from the summary written by the
+    ingestion (summary.py), or from a grouped query if it is not valid
+    (the archive changed since it was written).
+    Monthly totals and year.csv are cached at class level, so all the
+    instances share them: an entry is valid while path, mtime and size of
+    its file do not change, and invalidate() drops everything after an
+    ingestion. The tables of a year are not cached here: get_table reads
+    them every time and the caller keeps the years it needs (MainView
+    keeps a bounded number of them), so a year dropped there is freed.
     '''
+    _cache = {}  # chiave -> (stamp dei file, valore)
+
     def __init__(self):
-        pass
+        self._store = None
+
+    @classmethod
+    def invalidate(cls):
+        cls._cache.clear()
+
+    def _cached(self, key, path, build):
+        stamp = _file_stamp(path)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        value = build()
+        # stamp riletto dopo build: la prima apertura crea o migra l'archivio
+        self._cache[key] = (_file_stamp(path), value)
+        return value
+
+    def store(self, log=print):
+        # log: messaggi della prima apertura (print, o quello della
+        # contabilizzazione in background)
+        if self._store is None:
+            if not (PATH_CSV_SUPPLIERS.exists() and PATH_CSV_CLIENTS.exists()):
+                log("File CSV non trovato. Creo file vuoti.")
+                rwcsvxml.make_csv_default_clifor(log)
+            self._store = InvoiceStore(PATH_DB)
+            self._store.migrate_from_csv(CSV_BY_SIDE, log)
+        return self._store
 
     def start_data(self):
+        # all'avvio servono solo i totali mensili, letti dal riepilogo: le
+        # scadenze (data_clients, data_suppliers) vengono caricate quando le
+        # liste sono mostrate la prima volta (get_table)
         try:
-            data_suppliers, data_clients = self._load_csv_data()
             dati_table_head = self._build_table_head()
             return {
-                "data_clients": data_clients,
-                "data_suppliers": data_suppliers,
+                "data_clients": None,
+                "data_suppliers": None,
                 "dati_table_head": dati_table_head
             }
         except Exception:
@@ -35,34 +94,111 @@ class DataProvider():
             traceback.print_exc()
             return None
 
-    def _load_csv_data(self):
+    def get_table(self, side, year=None):
+        # scadenze del lato (di un anno, con l'indice (lato, anno, mese)
+        # dell'archivio) in una DeadlineTable a colonne, condivisa da indice,
+        # liste e finestre di dettaglio; non in cache: la memoria di un anno
+        # è liberata quando chi la usa lo scarta
+        return DeadlineTable(self.store().rows(side, year))
+
+    def get_totals(self, side):
+        # MonthlyTotals di tutti gli anni del lato
+        # (valido finché l'archivio non cambia)
+        return self._cached(("totals", side), PATH_DB, lambda: self._summary_totals(side))
+
+    def _summary_totals(self, side):
+        summary = DeadlineSummary(PATH_SUMMARY)
+        changes = self.store().changes(side)
+        totals = summary.totals(side, changes)
+        if totals is None:
+            # riepilogo mancante o non aggiornato: ricalcolato dall'archivio;
+            # il contatore è letto prima, così una modifica nel frattempo
+            # rende il riepilogo non valido invece di perderla
+            totals = self.store().monthly_totals(side)
+            summary.set_side(side, totals, changes)
+        if summary.dirty:
+            self._save_summary(summary)
+        return totals
+
+    def _save_summary(self, summary, log=print):
         try:
-            data_suppliers = rwcsvxml.read_csv_clifor(PATH_CSV_SUPPLIERS)
-            data_clients = rwcsvxml.read_csv_clifor(PATH_CSV_CLIENTS)
-        except FileNotFoundError:
-            print("File CSV non trovato. Creo file vuoti.")
-            rwcsvxml.make_csv_default_clifor()
-            data_suppliers = rwcsvxml.read_csv_clifor(PATH_CSV_SUPPLIERS)
-            data_clients = rwcsvxml.read_csv_clifor(PATH_CSV_CLIENTS)
-        except ValueError:
-            raise ValueError("Errore nella conversione dei dati CSV.")
-        return data_suppliers, data_clients
-
-    def _build_table_head(self):
-        active_year = self.get_year_active()
-        scad_gen = scadenz.ViewScadGen(PATH_CSV_SUPPLIERS)
-
-        scadenze_for = ["Fornitori"] + list(scad_gen.scad_cli_for(active_year))
-        scad_gen.change_file(PATH_CSV_CLIENTS)
-        scadenze_cli = ["Clienti"] + list(scad_gen.scad_cli_for(active_year))
-
-        differenze = ["Differenza"]
-        for i in range(1, len(scadenze_for)):
-            try:
-                diff = float(scadenze_cli[i]) - float(scadenze_for[i])
-                differenze.append(f"{diff:.2f}")
-            except ValueError:
-                differenze.append("Errore")
+            summary.save()
+        except OSError as e:
+            log(f"Riepilogo scadenze non salvato: {e}")
+
+    def import_rows(self, side, csv_rows, log=print):
+        # sostituisce le scadenze di un lato con le righe CSV della
+        # contabilizzazione e ne scrive il riepilogo (totali, righe e
+        # contatore delle modifiche dell'archivio);
+        # log riceve i messaggi, che in background non vanno sullo schermo
+        csv_rows = list(csv_rows)
+        changes = self.store(log).replace_side(side, csv_rows)
+        header = [csv_column for csv_column, _ in CSV_TO_STORE]
+        totals = MonthlyTotals(csv_rows, header.index("DataScadenzaPagamento"),
+                               header.index("ImportoPagamento"))
+        summary = DeadlineSummary(PATH_SUMMARY, log)
+        summary.set_side(side, totals, changes)
+        self._save_summary(summary, log)
+        self.invalidate()
+
+    def add_rows(self, side, csv_rows, replaced=()):
+        """
+        Append CSV rows to side, removing first the rows in replaced (e.g. of
+        an invoice rewritten in watch mode), and return the rows added as
+        tuples of clifor_row, with the dates as yyyymmdd codes
+        (DeadlineIndex.add takes them). Return None, with nothing changed, if
+        the archive is busy (e.g. an ingestion is saving): try again later.
+        """
+        csv_rows, replaced = list(csv_rows), list(replaced)
+        try:
+            changes = self.store().replace_rows(side, replaced, csv_rows)
+        except sqlite3.OperationalError:
+            return None  # archivio occupato: lo segnala chi chiama
+        self.invalidate()
+        rows = self._clifor_rows(csv_rows)
+        totals = MonthlyTotals(rows, 2, 1)
+        if replaced:
+            totals.merge(MonthlyTotals(self._clifor_rows(replaced), 2, 1), -1)
+        summary = DeadlineSummary(PATH_SUMMARY)
+        summary.add(side, totals, changes)
+        if summary.dirty:
+            self._save_summary(summary)
+        return rows
+
+    def _clifor_rows(self, csv_rows):
+        header = [csv_column for csv_column, _ in CSV_TO_STORE]
+        rows = []
+        for row in csv_rows:
+            row = rwcsvxml.clifor_row(dict(zip(header, row)))
+            scadenza = datecodec.code(row[2])
+            if scadenza:
+                rows.append(row[:2] + (scadenza,) + row[3:5] + (datecodec.code(row[5]),) + row[6:])
+        return rows
+
+    def get_counterparty_totals(self, side, year, month=None):
+        """
+        Totals in cents by supplier (or client) of a year, or of one month,
+        grouped on the counterparty codes of the table: {(denominazione,
+        id_codice): cents}. Only the deadlines of the period are read.
+        """
+        table = DeadlineTable(self.store().rows(side, year, month))
+        # per le fatture clienti la controparte è il cessionario
+        return table.party_totals(column="party" if side == "suppliers" else "cess")
+
+    def _build_table_head(self, year=None):
+        # totali mensili dell'anno, da quelli di tutti gli anni letti una
+        # volta dal riepilogo o dall'archivio e poi in cache
+        active_year = year if year is not None else self.get_year_active()
+        totals_for = self.get_totals("suppliers")
+        totals_cli = self.get_totals("clients")
+
+        # differenze in centesimi, senza errori di arrotondamento
+        cents_for = totals_for.cents(active_year)
+        cents_cli = totals_cli.cents(active_year)
+        scadenze_for = ["Fornitori"] + [format_cents(cents) for cents in cents_for]
+        scadenze_cli = ["Clienti"] + [format_cents(cents) for cents in cents_cli]
+        differenze = ["Differenza"] + [format_cents(cli - fornitori)
+                                       for cli, fornitori in zip(cents_cli, cents_for)]
 
         return [tuple(scadenze_for), tuple(scadenze_cli), tuple(differenze)]
 
@@ -87,18 +223,23 @@ class DataProvider():
         data = self._build_table_head
         print (data)
        
+    def _read_year(self):
+        return self._cached(("year",), PATH_YEAR, rwcsvxml.read_year)
+
     def get_year_active(self):
-        year = rwcsvxml.read_year()
+        year = self._read_year()
         return int(year['active'])
                 
     def set_year_active(self, year):
         # set active year. Data input like: 2025
         rwcsvxml.write_year({'active': [year]})
+        self._cache.pop(("year",), None)
         
     def get_years_available(self):
-        years = rwcsvxml.read_year()
+        years = self._read_year()
         return years['available']
                 
     def set_years_available(self, years):
         # set list of available years. Data input list like: [1999, 2000, 2015]
-        rwcsvxml.write_year({'available': [years]})        
\ No newline at end of file
+        rwcsvxml.write_year({'available': [years]})
+        self._cache.pop(("year",), None)        
\ No newline at end of file
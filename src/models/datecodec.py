@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+# file name .......... datecodec.py
+# scope .............. compact date codec: dates as yyyymmdd integers, decoded
+# .................... once at load and formatted only for display
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import calendar
+from functools import lru_cache
+
+# codice di una data mancante o non valida
+EMPTY = 0
+
+def _make(year, month, day):
+    if not (1 <= year <= 9999 and 1 <= month <= 12
+            and 1 <= day <= calendar.monthrange(year, month)[1]):
+        raise ValueError(f"data non valida: {day:02d}-{month:02d}-{year}")
+    return year * 10000 + month * 100 + day
+
+@lru_cache(maxsize=65536)
+def parse(data_str):
+    """"dd-mm-yyyy" (CSV format) -> yyyymmdd. Raise ValueError if not valid."""
+    if len(data_str) != 10 or data_str[2] != "-" or data_str[5] != "-":
+        raise ValueError(f"data non valida: {data_str!r}")
+    return _make(int(data_str[6:]), int(data_str[3:5]), int(data_str[:2]))
+
+@lru_cache(maxsize=65536)
+def parse_iso(iso_str):
+    """"yyyy-mm-dd" (XML format) -> yyyymmdd. Raise ValueError if not valid."""
+    if len(iso_str) != 10 or iso_str[4] != "-" or iso_str[7] != "-":
+        raise ValueError(f"data non valida: {iso_str!r}")
+    return _make(int(iso_str[:4]), int(iso_str[5:7]), int(iso_str[8:]))
+
+def code(value):
+    """Code of value (a code, or a "dd-mm-yyyy" string); EMPTY if not valid."""
+    if isinstance(value, int):
+        return value
+    try:
+        return parse(value)
+    except (ValueError, TypeError):
+        return EMPTY
+
+def year(value):
+    return value // 10000
+
+def month(value):
+    return value // 100 % 100
+
+def year_month(value):
+    return value // 10000, value // 100 % 100
+
+def format_date(value):
+    """yyyymmdd -> "dd-mm-yyyy", for CSV files and display ("" for EMPTY)."""
+    if isinstance(value, str):
+        return value  # già formattata
+    if not value:
+        return ""
+    return f"{value % 100:02d}-{value // 100 % 100:02d}-{value // 10000:04d}"
@@ -0,0 +1,63 @@
+#!/usr/bin/python3
+# file name .......... deadline_index.py
+# scope .............. index (year, month) -> row positions of the deadlines,
+# .................... used to filter the invoice lists without parsing dates
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+from bisect import insort
+import models.datecodec as datecodec
+from models.deadline_table import DeadlineTable
+
+class DeadlineIndex:
+    '''
+    Index (year, month) -> positions of the deadlines of a DeadlineTable (a
+    table is also built from rows of clifor_row). The keys are read from
+    the date columns of the table, already decoded; then filtering a month or
+    a year is a dictionary lookup. Rows are only appended: the positions of
+    every bucket are kept in the order of the CSV files (deadline date, then
+    document date).
+    '''
+
+    def __init__(self, table=()):
+        self.table = table if isinstance(table, DeadlineTable) else DeadlineTable(table)
+        self.buckets = {}    # (anno, mese) -> posizioni nella tabella, ordinate
+        scadenze = self.table.column("scadenza")
+        date_doc = self.table.column("data")
+        self._key = lambda position: (scadenze[position], date_doc[position])
+        # prima costruzione: accoda e ordina ogni gruppo una volta sola
+        for position in range(len(self.table)):
+            self._bucket(position).append(position)
+        for positions in self.buckets.values():
+            positions.sort(key=self._key)
+
+    def _bucket(self, position):
+        year_month = datecodec.year_month(self.table.scadenza[position])
+        return self.buckets.setdefault(year_month, [])
+
+    def add(self, rows):
+        """
+        Append rows (e.g. arrived in watch mode) to the table, updating only
+        their buckets. Return the positions of the rows added.
+        """
+        positions = self.table.extend(rows)
+        for position in positions:
+            insort(self._bucket(position), position, key=self._key)
+        return positions
+
+    def positions(self, year, month=None):
+        """Positions of the deadlines of a month of year, or of the whole year."""
+        if month is not None:
+            return list(self.buckets.get((year, month), ()))
+        positions = []
+        for month in range(1, 13):
+            positions.extend(self.buckets.get((year, month), ()))
+        return positions
+
+    def years(self):
+        return sorted({year for year, _ in self.buckets})
+
+    def __len__(self):
+        return len(self.table)
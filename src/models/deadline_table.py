@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+# file name .......... deadline_table.py
+# scope .............. columnar store of the loaded deadlines, shared by data
+# .................... provider, index, lists and popups through row positions
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+from array import array
+import models.datecodec as datecodec
+from models.amounts import to_cents, format_cents, group_sums
+
+# colonne nell'ordine delle tuple di clifor_row
+FIELDS = ("denominazione", "importo", "scadenza", "numero", "id_codice", "data",
+          "totale", "modalita", "cessionario", "id_codice_cess")
+# text: stringhe; cents: importi in centesimi; date: codici yyyymmdd
+KINDS = ("text", "cents", "date", "text", "text", "date", "cents", "text", "text", "text")
+
+class Dictionary:
+    '''
+    Dictionary encoding of repeated values: every distinct value gets a small
+    integer code, in order of arrival. Rows store the codes, the values are
+    kept once here.
+    '''
+    __slots__ = ("values", "codes")
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def code_of(self, value):
+        """Code of value, or -1 if never seen (nothing is added)."""
+        return self.codes.get(value, -1)
+
+    def __len__(self):
+        return len(self.values)
+
+class InvoiceRow:
+    '''
+    View on one deadline of a DeadlineTable: it holds only the table and the
+    position, the values are read from the columns when needed. row[i] gives
+    the stored value (cents and yyyymmdd codes), display(i) the formatted
+    text.
+    '''
+    __slots__ = ("table", "position")
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    def __getitem__(self, col):
+        return self.table.value(self.position, col)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __iter__(self):
+        return (self.table.value(self.position, col) for col in range(len(FIELDS)))
+
+    def display(self, col):
+        return self.table.display(self.position, col)
+
+class DisplayRows:
+    '''
+    Sequence of the formatted rows of some positions of a table, limited to
+    the given columns. Each tuple is built only when it is read, so the
+    lists of the interface do not copy the data.
+    '''
+    __slots__ = ("table", "positions", "columns")
+
+    def __init__(self, table, positions, columns):
+        self.table = table
+        self.positions = positions
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getitem__(self, i):
+        position = self.positions[i]
+        return tuple(self.table.display(position, col) for col in self.columns)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.positions)))
+
+class DeadlineTable:
+    '''
+    Deadlines of one side stored by column: amounts in cents and dates as
+    yyyymmdd codes in array('q') buffers. The counterparties are dictionary
+    encoded: (Denominazione, IdCodice) and (Cessionario, IdCodiceCess) are
+    interned once in the counterparty table (parties) and every row keeps
+    only their integer codes, like ModalitaPagamento (payment_modes); only
+    the document number is kept as text. Rows come in as tuples of
+    clifor_row (strings, cents or codes) and are only appended, so a
+    position stays valid for the life of the table. Rows without a valid
+    deadline date are skipped.
+    '''
+
+    def __init__(self, rows=()):
+        self.parties = Dictionary()        # (denominazione, id_codice) -> codice
+        self.payment_modes = Dictionary()  # ModalitaPagamento -> codice
+        self.party = array("q")            # fornitore o cliente della fattura
+        self.cess = array("q")             # cessionario
+        self.modalita = array("q")
+        self.importo = array("q")
+        self.totale = array("q")
+        self.scadenza = array("q")
+        self.data = array("q")
+        self.numero = []
+        self.skipped = 0
+        self._getters = (
+            lambda p: self.parties.values[self.party[p]][0],
+            self.importo.__getitem__,
+            self.scadenza.__getitem__,
+            self.numero.__getitem__,
+            lambda p: self.parties.values[self.party[p]][1],
+            self.data.__getitem__,
+            self.totale.__getitem__,
+            lambda p: self.payment_modes.values[self.modalita[p]],
+            lambda p: self.parties.values[self.cess[p]][0],
+            lambda p: self.parties.values[self.cess[p]][1],
+        )
+        self.extend(rows)
+
+    def append(self, row):
+        """Append a row; return its position, or None if skipped."""
+        scadenza = datecodec.code(row[2])
+        if not scadenza:
+            self.skipped += 1
+            return None
+        try:
+            importo, totale = to_cents(row[1]), to_cents(row[6])
+        except (ValueError, TypeError, AttributeError):
+            self.skipped += 1
+            return None
+        self.party.append(self.parties.encode((row[0], row[4])))
+        self.cess.append(self.parties.encode((row[8], row[9])))
+        self.modalita.append(self.payment_modes.encode(row[7]))
+        self.importo.append(importo)
+        self.totale.append(totale)
+        self.scadenza.append(scadenza)
+        self.data.append(datecodec.code(row[5]))
+        self.numero.append(row[3])
+        return len(self.scadenza) - 1
+
+    def extend(self, rows):
+        """Append rows; return the positions of the rows added."""
+        positions = []
+        for row in rows:
+            position = self.append(row)
+            if position is not None:
+                positions.append(position)
+        return positions
+
+    def __len__(self):
+        return len(self.scadenza)
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return InvoiceRow(self, position)
+
+    def __iter__(self):
+        return (InvoiceRow(self, position) for position in range(len(self)))
+
+    def column(self, name):
+        """Stored column: scadenza, data, importo, totale, party, cess, modalita, numero."""
+        return getattr(self, name)
+
+    def value(self, position, col):
+        return self._getters[col](position)
+
+    def display(self, position, col):
+        value = self._getters[col](position)
+        kind = KINDS[col]
+        if kind == "cents":
+            return format_cents(value)
+        if kind == "date":
+            return datecodec.format_date(value)
+        return value
+
+    def display_rows(self, positions, columns):
+        return DisplayRows(self, positions, columns)
+
+    def party_codes(self, name, id_codice=None):
+        """Codes of the counterparties with Denominazione name (and IdCodice)."""
+        if id_codice is not None:
+            code = self.parties.code_of((name, id_codice))
+            return {code} if code >= 0 else set()
+        return {code for code, (party_name, _) in enumerate(self.parties.values)
+                if party_name == name}
+
+    def positions_of(self, codes, positions=None, column="party"):
+        """Positions (all, or among positions) whose counterparty code is in codes."""
+        party = getattr(self, column)
+        if positions is None:
+            positions = range(len(self))
+        return [position for position in positions if party[position] in codes]
+
+    def party_totals(self, positions=None, column="party"):
+        """
+        Totals in cents by counterparty of the rows at positions (all rows if
+        None), grouped on the integer codes: {(denominazione, id_codice): cents}.
+        """
+        party = getattr(self, column)
+        if positions is None:
+            keys, cents = party, self.importo
+        else:
+            keys = array("q", (party[position] for position in positions))
+            cents = array("q", (self.importo[position] for position in positions))
+        values = self.parties.values
+        return {values[code]: total for code, total in group_sums(keys, cents).items()}
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+# file name .......... fattura_schema.py
+# scope .............. declarative schema of the fields read from the XML
+# .................... invoices (ADE) and of the columns of the CSV files
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import lxml.etree as ET
+
+# Sezioni della fattura da leggere. Per ogni sezione:
+# - path: percorso dalla radice <FatturaElettronica>
+# - mode: "first" usa solo il primo elemento trovato, "merge" tutti gli
+#         elementi (a parità di campo vince l'ultimo), "each" numera i campi di
+#         ogni elemento (ImportoPagamento1, ImportoPagamento2, ...)
+# - fields: chiave in uscita -> percorso relativo alla sezione, oppure tupla di
+#           percorsi alternativi (vince il primo trovato)
+# - defaults: valori usati se il campo non è presente
+XML_SCHEMA = {
+    "pag": {
+        "path": "FatturaElettronicaBody/DatiPagamento/DettaglioPagamento",
+        "mode": "each",
+        "fields": {
+            "ModalitaPagamento": "ModalitaPagamento",
+            "DataScadenzaPagamento": "DataScadenzaPagamento",
+            "ImportoPagamento": "ImportoPagamento",
+        },
+    },
+    "ana": {
+        "path": "FatturaElettronicaHeader/CedentePrestatore/DatiAnagrafici",
+        "mode": "first",
+        "fields": {
+            "Denominazione": ("Anagrafica/Denominazione", "Anagrafica/Cognome"),
+            "IdCodice": "IdFiscaleIVA/IdCodice",
+        },
+        "defaults": {"Denominazione": "Sconosciuto"},
+    },
+    "doc": {
+        "path": "FatturaElettronicaBody/DatiGenerali/DatiGeneraliDocumento",
+        "mode": "first",
+        "fields": {
+            "TipoDocumento": "TipoDocumento",
+            "Data": "Data",
+            "Numero": "Numero",
+            "ImportoTotaleDocumento": "ImportoTotaleDocumento",
+        },
+    },
+    "imp": {
+        "path": "FatturaElettronicaBody/DatiBeniServizi/DatiRiepilogo",
+        "mode": "merge",
+        "fields": {
+            "ImponibileImporto": "ImponibileImporto",
+            "Imposta": "Imposta",
+        },
+    },
+    "cess": {
+        "path": "FatturaElettronicaHeader/CessionarioCommittente/DatiAnagrafici",
+        "mode": "first",
+        "fields": {
+            "FDenominazione": "Anagrafica/Denominazione",
+            "FIdCodice": "IdFiscaleIVA/IdCodice",
+        },
+    },
+}
+
+# ordine delle sezioni nel risultato di read_xml_scad_stream, dopo il numero di scadenze
+SCAD_SECTIONS = ("pag", "ana", "doc", "imp", "cess")
+
+# Colonne dei file CSV: (intestazione, sezione, campo, tipo). Per il tipo
+# "amount" il campo può essere una tupla di campi da sommare. Per aggiungere
+# una colonna basta aggiungere il campo in XML_SCHEMA e la colonna qui.
+CSV_COLUMNS = (
+    ("Denominazione", "ana", "Denominazione", "text"),
+    ("IdCodice", "ana", "IdCodice", "text"),
+    ("TipoDocumento", "doc", "TipoDocumento", "text"),
+    ("Numero", "doc", "Numero", "text"),
+    ("Data", "doc", "Data", "date"),
+    ("ImportoTotaleDocumento", "imp", ("ImponibileImporto", "Imposta"), "amount"),
+    ("DataScadenzaPagamento", "pag", "DataScadenzaPagamento", "date"),
+    ("ImportoPagamento", "pag", "ImportoPagamento", "amount"),
+    ("ModalitaPagamento", "pag", "ModalitaPagamento", "text"),
+    ("Cessionario", "cess", "FDenominazione", "text"),
+    ("IdCodiceCess", "cess", "FIdCodice", "text"),
+)
+
+class Section:
+    '''
+    One section of XML_SCHEMA compiled once into lxml XPath evaluators.
+    extract() reads only the declared leaves of a section element.
+    '''
+    __slots__ = ("name", "path", "mode", "tag", "parent_tag", "find_all", "fields", "defaults")
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.path = spec["path"]
+        self.mode = spec["mode"]
+        steps = self.path.split("/")
+        self.tag = steps[-1]
+        self.parent_tag = steps[-2]
+        self.find_all = ET.XPath(self.path)
+        self.fields = []
+        for key, paths in spec["fields"].items():
+            if isinstance(paths, str):
+                paths = (paths,)
+            self.fields.append((key, tuple(ET.XPath(path) for path in paths)))
+        self.defaults = spec.get("defaults", {})
+
+    def extract(self, element, out, suffix=""):
+        for key, xpaths in self.fields:
+            for xpath in xpaths:
+                found = xpath(element)
+                if found:
+                    out[f"{key}{suffix}"] = found[-1].text or ""
+                    break
+        return out
+
+    def finish(self, out):
+        for key, value in self.defaults.items():
+            out.setdefault(key, value)
+        return out
+
+SECTIONS = {name: Section(name, spec) for name, spec in XML_SCHEMA.items()}
+
+# sezioni indicizzate per (tag del padre, tag), usate dalla lettura in streaming
+SECTIONS_BY_TAG = {(s.parent_tag, s.tag): s for s in SECTIONS.values()}
+
+def extract_tree(root):
+    """
+    Apply the schema to a parsed document. Return (payment elements, dict of
+    sections); the payment elements are needed to add missing deadlines.
+    """
+    result = {}
+    payments = []
+    for name, section in SECTIONS.items():
+        out = {}
+        elements = section.find_all(root)
+        if section.mode == "each":
+            payments = elements
+            for i, element in enumerate(elements, start=1):
+                section.extract(element, out, str(i))
+        elif section.mode == "first":
+            if elements:
+                section.extract(elements[0], out)
+        else:
+            for element in elements:
+                section.extract(element, out)
+        result[name] = section.finish(out)
+    return payments, result
+
+def column_value(scad_sections, column, index):
+    """Value of a CSV column for the deadline number index (1, 2, ...)."""
+    _, section, keys, kind = column
+    data = scad_sections[section]
+    suffix = str(index) if XML_SCHEMA[section]["mode"] == "each" else ""
+    if kind == "amount":
+        if isinstance(keys, str):
+            keys = (keys,)
+        return sum(float(data.get(f"{key}{suffix}") or 0) for key in keys)
+    if kind == "date":
+        return data[f"{keys}{suffix}"]
+    return data.get(f"{keys}{suffix}", "")
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+# file name .......... ingest_job.py
+# scope .............. ingestion of the XML invoices in a background thread,
+# .................... with progress and cancellation for the interface
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import threading
+import time
+from models.scadenz import IngestCancelled
+
+class IngestProgress:
+    '''
+    State of a running ingestion, passed to the interface: the stage (side
+    being read), files done and total, files with errors, and the rate and
+    estimated time left of the stage.
+    '''
+    __slots__ = ("stage", "done", "total", "errors", "elapsed")
+
+    def __init__(self, stage="", done=0, total=0, errors=0, elapsed=0.0):
+        self.stage = stage
+        self.done = done
+        self.total = total
+        self.errors = errors
+        self.elapsed = elapsed
+
+    @property
+    def rate(self):
+        """Files per second."""
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Seconds left for the stage, or None if not known yet."""
+        if not self.rate or not self.total:
+            return None
+        return max(0.0, (self.total - self.done) / self.rate)
+
+class IngestJob(threading.Thread):
+    '''
+    Background thread that runs ingest(progress, cancel, log), e.g.
+    AccountInvoices.make_csv with its paths. progress(stage, done, total,
+    errors) is called by the reading; at most every interval seconds (and at
+    the end of each stage) an IngestProgress is passed to on_progress. At the
+    end on_done(result, cancelled, messages) is called; messages are the
+    lines passed to log during the run, kept out of the screen. Both
+    callbacks are called from this thread: the caller moves them to the
+    interface thread (see ControllerW.start_ingest). cancel() asks the reading to stop:
+    ingest discards what it has read and raises IngestCancelled.
+    '''
+
+    def __init__(self, ingest, on_progress, on_done, interval=0.1):
+        super().__init__(name="scadenzade-ingest", daemon=True)
+        self.ingest = ingest
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.interval = interval
+        self.cancel_event = threading.Event()
+        self._stage = None
+        self._stage_start = 0.0
+        self._last_report = 0.0
+        self.messages = []
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def report(self, stage, done, total, errors):
+        now = time.perf_counter()
+        if stage != self._stage:
+            self._stage, self._stage_start, self._last_report = stage, now, 0.0
+        # aggiornamenti diradati: la pipe verso l'interfaccia non va inondata
+        if now - self._last_report < self.interval and done != total:
+            return
+        self._last_report = now
+        self.on_progress(IngestProgress(stage, done, total, errors, now - self._stage_start))
+
+    def run(self):
+        cancelled = False
+        try:
+            # i messaggi della lettura sono raccolti, non stampati sopra l'interfaccia
+            result = self.ingest(self.report, self.cancel_event, self.messages.append)
+        except IngestCancelled:
+            result, cancelled = False, True
+        except Exception as e:
+            self.messages.append(f"Errore durante la contabilizzazione: {e}")
+            result = False
+        self.on_done(result, cancelled, list(self.messages))
@@ -0,0 +1,220 @@
+#!/usr/bin/python3
+# file name .......... invoice_store.py
+# scope .............. SQLite archive of the invoice deadlines, with indexes on
+# .................... deadline date, IdCodice and document number
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import sqlite3
+from datetime import datetime
+import models.readwrite_csv_xml as rwxml
+import models.datecodec as datecodec
+from models.aggregate import MonthlyTotals
+from models.amounts import to_cents
+
+SIDES = ("suppliers", "clients")
+
+# colonne della tabella, nello stesso ordine delle colonne dei file CSV
+CSV_TO_STORE = (
+    ("Denominazione", "denominazione"),
+    ("IdCodice", "id_codice"),
+    ("TipoDocumento", "tipo_documento"),
+    ("Numero", "numero"),
+    ("Data", "data"),
+    ("ImportoTotaleDocumento", "importo_totale"),
+    ("DataScadenzaPagamento", "data_scadenza"),
+    ("ImportoPagamento", "importo_pagamento"),
+    ("ModalitaPagamento", "modalita_pagamento"),
+    ("Cessionario", "cessionario"),
+    ("IdCodiceCess", "id_codice_cess"),
+)
+_STORE_COLUMNS = [column for _, column in CSV_TO_STORE]
+
+# importi salvati in centesimi interi, convertiti con amounts.to_cents come
+# negli altri totali (arrotondamento decimale, metà per eccesso); NULL se
+# l'importo non è valido
+_CENTS_COLUMNS = ("importo_totale", "importo_pagamento")
+_CENTS_POSITIONS = [_STORE_COLUMNS.index(column) for column in _CENTS_COLUMNS]
+
+# colonne nell'ordine delle tuple di clifor_row, usate dall'interfaccia;
+# le date escono già come codici yyyymmdd (datecodec) e gli importi in centesimi
+_CLIFOR_COLUMNS = ("denominazione", "importo_pagamento",
+                   "year * 10000 + month * 100 + day", "numero", "id_codice", "data_key",
+                   "importo_totale", "modalita_pagamento", "cessionario",
+                   "id_codice_cess")
+
+_CREATE_DEADLINES = f"""
+CREATE TABLE IF NOT EXISTS deadlines (
+    side TEXT NOT NULL,
+    {", ".join(f"{column} {'INTEGER' if column in _CENTS_COLUMNS else 'TEXT'}" for column in _STORE_COLUMNS)},
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    data_key INTEGER NOT NULL,
+    seq INTEGER NOT NULL
+)"""
+
+_SCHEMA = f"""
+{_CREATE_DEADLINES};
+CREATE INDEX IF NOT EXISTS deadlines_date ON deadlines (side, year, month);
+CREATE INDEX IF NOT EXISTS deadlines_id_codice ON deadlines (id_codice);
+CREATE INDEX IF NOT EXISTS deadlines_numero ON deadlines (numero);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+_ORDER = "ORDER BY year, month, day, data_key, seq"
+
+class InvoiceStore:
+    '''
+    Archive of the deadlines of both sides in a SQLite database (stdlib
+    sqlite3). Rows come in with the columns of the CSV files (the amounts
+    are stored as integer cents, see amounts.to_cents) and go out as
+    the tuples of clifor_row, with the dates as yyyymmdd codes
+    (datecodec) and the amounts in cents, in the same order of the CSV files (deadline date, then
+    document date). Queries by year and month use the
+    (side, year, month) index instead of reading the whole file.
+    Every change of a side increments its counter in the meta table, in the
+    same transaction (changes), so what is calculated from the rows (e.g.
+    the summary) can tell if it is still up to date.
+    '''
+
+    def __init__(self, db_filename):
+        self.filename = str(db_filename)
+        self.conn = sqlite3.connect(self.filename)
+        self._upgrade()
+        self.conn.executescript(_SCHEMA)
+
+    def _upgrade(self):
+        # archivi delle versioni precedenti, con gli importi salvati come
+        # testo: tabella ricreata con i centesimi, in una sola transazione
+        types = {row[1]: row[2] for row in self.conn.execute("PRAGMA table_info(deadlines)")}
+        if types.get("importo_pagamento") != "TEXT":
+            return
+        placeholders = ", ".join("?" * (len(_STORE_COLUMNS) + 6))
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("ALTER TABLE deadlines RENAME TO deadlines_text")
+            self.conn.execute(_CREATE_DEADLINES)
+            self.conn.executemany(
+                f"INSERT INTO deadlines VALUES ({placeholders})",
+                (self._to_cents(record, 1) for record in self.conn.execute("SELECT * FROM deadlines_text")))
+            self.conn.execute("DROP TABLE deadlines_text")
+
+    @staticmethod
+    def _to_cents(record, first):
+        # importi di un record (colonne della tabella da first) in centesimi
+        record = list(record)
+        for position in _CENTS_POSITIONS:
+            try:
+                record[first + position] = to_cents(record[first + position])
+            except (ValueError, TypeError, AttributeError):
+                record[first + position] = None
+        return record
+
+    def close(self):
+        self.conn.close()
+
+    def _records(self, side, csv_rows, first_seq=0):
+        # righe CSV (liste nell'ordine delle colonne) -> record della tabella;
+        # le righe con scadenza non valida vengono scartate come in DeadlineTable
+        for seq, row in enumerate(csv_rows, start=first_seq):
+            try:
+                scadenza = datecodec.parse(row[6])
+            except (ValueError, IndexError):
+                continue
+            data_key = datecodec.code(row[4])
+            yield (side, *self._to_cents(row[:len(_STORE_COLUMNS)], 0), datecodec.year(scadenza),
+                   datecodec.month(scadenza), scadenza % 100, data_key, seq)
+
+    def _bump(self, side):
+        # contatore delle modifiche del lato, nella transazione aperta
+        changes = self.changes(side) + 1
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"changes_{side}", str(changes)))
+        return changes
+
+    def changes(self, side):
+        """Number of changes of side (0 for a new archive)."""
+        return int(self.get_meta(f"changes_{side}", 0))
+
+    def replace_side(self, side, csv_rows):
+        """
+        Replace all the deadlines of side in a single transaction. Return the
+        new counter of changes of side.
+        """
+        placeholders = ", ".join("?" * (len(_STORE_COLUMNS) + 6))
+        with self.conn:
+            self.conn.execute("DELETE FROM deadlines WHERE side = ?", (side,))
+            self.conn.executemany(f"INSERT INTO deadlines VALUES ({placeholders})",
+                                  self._records(side, csv_rows))
+            return self._bump(side)
+
+    def add_rows(self, side, csv_rows):
+        """Append deadlines to side (e.g. invoices read in watch mode)."""
+        return self.replace_rows(side, (), csv_rows)
+
+    def replace_rows(self, side, old_csv_rows, csv_rows):
+        """
+        In a single transaction remove old_csv_rows from side (one stored
+        deadline for each row, e.g. the rows of an invoice rewritten in watch
+        mode) and append csv_rows. Return the new counter of changes of side.
+        """
+        placeholders = ", ".join("?" * (len(_STORE_COLUMNS) + 6))
+        match = " AND ".join(f"{column} IS ?" for column in _STORE_COLUMNS)
+        with self.conn:
+            for record in self._records(side, old_csv_rows):
+                self.conn.execute(
+                    "DELETE FROM deadlines WHERE rowid = (SELECT rowid FROM deadlines "
+                    f"WHERE side = ? AND {match} LIMIT 1)", record[:len(_STORE_COLUMNS) + 1])
+            next_seq = self.conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM deadlines WHERE side = ?", (side,)
+            ).fetchone()[0]
+            self.conn.executemany(f"INSERT INTO deadlines VALUES ({placeholders})",
+                                  self._records(side, csv_rows, next_seq))
+            return self._bump(side)
+
+    def rows(self, side, year=None, month=None):
+        """Deadlines of side (all, of a year, or of a month of a year)."""
+        query = f"SELECT {', '.join(_CLIFOR_COLUMNS)} FROM deadlines WHERE side = ?"
+        params = [side]
+        if year is not None:
+            query += " AND year = ?"
+            params.append(year)
+            if month is not None:
+                query += " AND month = ?"
+                params.append(month)
+        return self.conn.execute(f"{query} {_ORDER}", params).fetchall()
+
+    def monthly_totals(self, side, year=None):
+        """
+        MonthlyTotals of side for all years, with a single GROUP BY query summing
+        integer cents; with year, only the list of its 12 totals formatted like
+        the CSV.
+        """
+        totals = MonthlyTotals.from_sums(self.conn.execute(
+            "SELECT year, month, SUM(importo_pagamento), COUNT(importo_pagamento) "
+            "FROM deadlines WHERE side = ? GROUP BY year, month", (side,)))
+        return totals if year is None else totals.year(year)
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def migrate_from_csv(self, csv_by_side, log=print):
+        """
+        One-shot import of the existing CSV files ({side: path}), done only
+        the first time the database is opened. Return True if done now.
+        """
+        if self.get_meta("migrated_from_csv"):
+            return False
+        header = [csv_column for csv_column, _ in CSV_TO_STORE]
+        for side, csv_filename in csv_by_side.items():
+            raw_rows = rwxml.read_csv_raw(csv_filename, log)
+            self.replace_side(side, ([row.get(column, "") for column in header] for row in raw_rows))
+        self.set_meta("migrated_from_csv", datetime.now().isoformat(timespec="seconds"))
+        return True
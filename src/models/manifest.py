@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+# file name .......... manifest.py
+# scope .............. persistent manifest of the XML files already read, used
+# .................... to re-read only new or changed invoices
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import json
+import models.readwrite_csv_xml as rwxml
+from models.sources import source_fingerprint, source_stat
+
+class IngestManifest:
+    '''
+    Manifest of the XML invoices of one side (suppliers or clients), saved in
+    JSON next to the CSV data in data_box. For every source (file or ZIP
+    member, see sources.py) it records path, size, mtime (CRC32 for ZIP
+    members), sha1 and the result of read_xml_scad_stream, in this format:
+    {"/path/fattura.xml": {"size": 1234, "mtime_ns": 1700000000000000000,
+    "sha1": "ab12...", "scad": [1, {...}, {...}, {...}, {...}, {...}]}}
+    '''
+
+    def __init__(self, manifest_filename, log=print):
+        self.filename = str(manifest_filename)
+        self.entries = {}
+        self.load(log)
+
+    def load(self, log=print):
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+        except (ValueError, OSError) as e:
+            log(f"Manifest non leggibile, verrà ricreato: {e}")
+            self.entries = {}
+        return self.entries
+
+    def save(self):
+        with rwxml.atomic_write(self.filename) as f:
+            json.dump(self.entries, f, ensure_ascii=False, separators=(",", ":"))
+
+    def changed_files(self, files):
+        """
+        Return the files to read again: new files and files whose content
+        changed. Files with different size/mtime but same sha1 are only
+        updated in the manifest.
+        """
+        changed = []
+        for file_path in files:
+            entry = self.entries.get(file_path)
+            if entry is None:
+                changed.append(file_path)
+                continue
+            try:
+                if source_stat(file_path) == (entry["size"], entry["mtime_ns"]):
+                    continue
+                size, mtime_ns, sha1 = source_fingerprint(file_path)
+            except OSError:
+                changed.append(file_path)
+                continue
+            if sha1 == entry["sha1"]:
+                entry["size"], entry["mtime_ns"] = size, mtime_ns
+            else:
+                changed.append(file_path)
+        return changed
+
+    def update(self, file_path, scad, fingerprint):
+        size, mtime_ns, sha1 = fingerprint
+        self.entries[file_path] = {"size": size, "mtime_ns": mtime_ns, "sha1": sha1, "scad": scad}
+
+    def prune(self, files):
+        """Drop the entries of files no longer present. Return how many were removed."""
+        keep = set(files)
+        removed = [file_path for file_path in self.entries if file_path not in keep]
+        for file_path in removed:
+            del self.entries[file_path]
+        return len(removed)
+
+    def sha1(self, file_path):
+        return self.entries[file_path]["sha1"]
+
+    def scad(self, file_path):
+        scad = self.entries[file_path]["scad"]
+        return tuple(scad) if scad is not None else None
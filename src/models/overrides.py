@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+# file name .......... overrides.py
+# scope .............. sidecar store of the deadlines added to invoices
+# .................... without DataScadenzaPagamento
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import csv
+import os
+from models.add_scad import add_scad
+import models.readwrite_csv_xml as rwxml
+
+class DeadlineOverrides:
+    '''
+    Deadlines added to the payments without "DataScadenzaPagamento", stored in
+    a single CSV file instead of being written in the original XML invoices.
+    The key is (sha1 of the file, payment index), so the same invoice gets the
+    same deadline at every ingestion, whatever its path. New deadlines are
+    written all together by save(). With filename=None nothing is saved.
+    '''
+    FIELDNAMES = ["sha1", "indice", "DataScadenzaPagamento", "file"]
+
+    def __init__(self, filename=None, log=print):
+        self.filename = str(filename) if filename else None
+        self.deadlines = {}
+        self.files = {}
+        self.added = 0
+        self.load(log)
+
+    def load(self, log=print):
+        if not self.filename:
+            return self.deadlines
+        try:
+            with open(self.filename, "r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f, delimiter=";"):
+                    key = (row["sha1"], int(row["indice"]))
+                    self.deadlines[key] = row["DataScadenzaPagamento"]
+                    self.files[key] = row.get("file", "")
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, OSError) as e:
+            log(f"Errore nella lettura del file {self.filename}: {e}")
+        return self.deadlines
+
+    def apply(self, scad, sha1, file_path="", manual_scad=False, data_manual=None):
+        """
+        Return scad with the missing deadlines filled from the store, or
+        calculated with add_scad and recorded as new. Return None if add_scad
+        cannot give a deadline (manual_scad without data_manual).
+        """
+        if not scad or not scad[0]:
+            return scad
+        ret_pag = scad[1]
+        missing = [i for i in range(1, scad[0] + 1) if f"DataScadenzaPagamento{i}" not in ret_pag]
+        if not missing:
+            return scad
+
+        ret_pag = dict(ret_pag)  # non modifica i dati del manifest
+        for i in missing:
+            key = (sha1, i)
+            scadenza = self.deadlines.get(key)
+            if scadenza is None:
+                scadenza = add_scad(scad[3], scad[2], manual_scad, data_manual, verbose=False)
+                if scadenza is None:
+                    return None
+                self.deadlines[key] = scadenza
+                self.files[key] = os.path.basename(file_path)
+                self.added += 1
+            ret_pag[f"DataScadenzaPagamento{i}"] = scadenza
+        return (scad[0], ret_pag) + tuple(scad[2:])
+
+    def save(self, log=print):
+        # scrittura in blocco e atomica, solo se ci sono nuove scadenze
+        if not self.filename or not self.added:
+            return
+        with rwxml.atomic_write(self.filename, newline="") as f:
+            writer = csv.writer(f, delimiter=";")
+            writer.writerow(self.FIELDNAMES)
+            for (sha1, index), scadenza in sorted(self.deadlines.items()):
+                writer.writerow([sha1, index, scadenza, self.files.get((sha1, index), "")])
+        log(f"Aggiunte {self.added} scadenze mancanti in '{self.filename}'")
+        self.added = 0
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# file name .......... prefetch.py
+# scope .............. background loading of the deadlines of the years next
+# .................... to the active one, so that changing year is instant
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import queue
+import threading
+from models.invoice_store import InvoiceStore, SIDES
+from models.deadline_index import DeadlineIndex
+from models.deadline_table import DeadlineTable
+
+def prefetch_order(center, available, limit):
+    """
+    Years to load around center: first center-1 and center+1, then the other
+    available years by distance from center; at most limit years.
+    """
+    years = {center - 1, center + 1} | {int(year) for year in available}
+    years.discard(center)
+    return sorted(years, key=lambda year: (abs(year - center), year))[:limit]
+
+class YearPrefetcher(threading.Thread):
+    '''
+    Background thread that reads from the archive the deadlines of the years
+    next to the active one and builds their DeadlineIndex, one side and one
+    year at a time. Every index is passed to on_index(side, year, index,
+    version) from this thread: the caller moves it to the interface thread
+    (see ControllerW.start_prefetch). schedule() replaces the current job, so
+    the years of a job no longer needed are not loaded (cancellation between
+    one year and the next). The thread uses its own SQLite connection.
+    '''
+
+    def __init__(self, db_filename, on_index):
+        super().__init__(name="scadenzade-prefetch", daemon=True)
+        self.db_filename = db_filename
+        self.on_index = on_index
+        self._jobs = queue.Queue()
+        self._generation = 0
+        self._stop_event = threading.Event()
+
+    def schedule(self, years, version=0, skip=()):
+        """
+        Load years (in order) for both sides, except the (side, year) in skip.
+        version is passed back with the indexes, to discard stale ones.
+        """
+        self._generation += 1
+        self._jobs.put((self._generation, list(years), version, set(skip)))
+
+    def cancel(self):
+        self._generation += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.cancel()
+        self._jobs.put(None)
+
+    def run(self):
+        store = InvoiceStore(self.db_filename)
+        try:
+            while not self._stop_event.is_set():
+                job = self._jobs.get()
+                if job is None:
+                    break
+                self._run_job(store, *job)
+        finally:
+            store.close()
+
+    def _run_job(self, store, generation, years, version, skip):
+        for year in years:
+            for side in SIDES:
+                if generation != self._generation:
+                    return  # sostituito da un nuovo lavoro o annullato
+                if (side, year) in skip:
+                    continue
+                index = DeadlineIndex(DeadlineTable(store.rows(side, year)))
+                if generation != self._generation:
+                    return
+                self.on_index(side, year, index, version)
@@ -5,11 +5,13 @@
 # author ............. Stefano Alemani
 # version ............ 0.6.0
 
+import contextlib
 import csv
+import os
+from itertools import zip_longest
 from typing import List, Dict, Tuple
-from models.add_scad import add_scad
+from models.fattura_schema import SECTIONS, SECTIONS_BY_TAG, SCAD_SECTIONS
 import lxml.etree as ET
-from datetime import datetime
 from config.constants import CONFIG_DIR, DATA_DIR, YearAct
 
 def read_csv_path() -> Dict[str, List[str]]:
@@ -17,9 +19,11 @@ def read_csv_path() -> Dict[str, List[str]]:
     try:
         with open(CONFIG_DIR / "path.csv", "r", newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f, delimiter=";")
+            # una riga per ogni percorso: le colonne vuote vengono ignorate
             for row in reader:
-                start_path["suppliers"].append(row.get("suppliers", ""))
-                start_path["clients"].append(row.get("clients", ""))
+                for side in ("suppliers", "clients"):
+                    if row.get(side):
+                        start_path[side].append(row[side])
 
     except Exception as e:
         print(f"Errore nella lettura del file path: {e}")
@@ -39,10 +43,11 @@ def write_csv_path(path_clients_suppliers: Dict[str, List[str]]) -> None:
         with (CONFIG_DIR / "path.csv").open("w", newline="", encoding="utf-8") as f:
             writer = csv.DictWriter(f, fieldnames=["suppliers", "clients"], delimiter=";")
             writer.writeheader()
-            writer.writerow({
-                "suppliers": suppliers[0],
-                "clients": clients[0]
-            })            
+            for supplier, client in zip_longest(suppliers, clients, fillvalue=""):
+                writer.writerow({
+                    "suppliers": supplier,
+                    "clients": client
+                })
     except Exception as e:
         print(f"Errore nella scrittura del file path.csv: {e}")
 
@@ -54,7 +59,7 @@ def ensure_csv_path_exists() -> None:
     except FileExistsError:
         pass  # Il file esiste già
         
-def make_csv_default_clifor() -> None:
+def make_csv_default_clifor(log=print) -> None:
     fieldnames = [
         'Denominazione', 'ImportoPagamento', 'DataScadenzaPagamento',
         'Numero', 'IdCodice', 'Data', 'ImportoTotaleDocumento',
@@ -66,38 +71,45 @@ def make_csv_default_clifor() -> None:
                 writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=";")
                 writer.writeheader()
         except Exception as e:
-            print(f"Errore nella creazione del file {filename}: {e}")
+            log(f"Errore nella creazione del file {filename}: {e}")
 
-def read_csv_raw(csv_filename: str) -> List[Dict[str, str]]:
+def read_csv_raw(csv_filename: str, log=print) -> List[Dict[str, str]]:
     try:
         with open(csv_filename, "r", newline="", encoding="utf-8") as f:
             reader = csv.DictReader(f, delimiter=";")
             return list(reader)
     except Exception as e:
-        print(f"Errore nella lettura del file CSV: {e}")
+        log(f"Errore nella lettura del file CSV: {e}")
         return []
 
-def read_csv_clifor(csv_filename: str) -> List[Tuple[str, ...]]:
-    raw_data = read_csv_raw(csv_filename)
-    all_data = []
-
-    for row in raw_data:
-        try:
-            data_str = row.get('DataScadenzaPagamento', '')
-            datetime.strptime(data_str, "%d-%m-%Y")  # solo per validare la data
-            all_data.append((
-                row.get('Denominazione', ''), row.get('ImportoPagamento', ''),
-                row.get('DataScadenzaPagamento', ''), row.get('Numero', ''),
-                row.get('IdCodice', ''), row.get('Data', ''),
-                row.get('ImportoTotaleDocumento', ''), row.get('ModalitaPagamento', ''),
-                row.get('Cessionario', ''), row.get('IdCodiceCess', '')
-            ))
-        except ValueError:
-            continue
-
-    return all_data
-    
-def write_csv_clifor(csv_filename: str, header: List[str], content: List[List[str]]) -> None:
+def clifor_row(row: Dict[str, str]) -> Tuple[str, ...]:
+    """Tuple used by the interface for a row of the CSV file (dict by column)."""
+    return (
+        row.get('Denominazione', ''), row.get('ImportoPagamento', ''),
+        row.get('DataScadenzaPagamento', ''), row.get('Numero', ''),
+        row.get('IdCodice', ''), row.get('Data', ''),
+        row.get('ImportoTotaleDocumento', ''), row.get('ModalitaPagamento', ''),
+        row.get('Cessionario', ''), row.get('IdCodiceCess', '')
+    )
+
+@contextlib.contextmanager
+def atomic_write(filename, newline=None):
+    """
+    Open filename for writing (utf-8) through a temporary file next to it,
+    renamed over filename only when the with block ends without errors: a
+    reader, or a crash during the write, never leaves a half-written file.
+    """
+    tmp_filename = str(filename) + ".tmp"
+    try:
+        with open(tmp_filename, "w", newline=newline, encoding="utf-8") as f:
+            yield f
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_filename)
+        raise
+
+def write_csv_clifor(csv_filename: str, header: List[str], content: List[List[str]], log=print) -> None:
     try:
         with open(csv_filename, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f, delimiter=";", quoting=csv.QUOTE_MINIMAL)
@@ -106,7 +118,7 @@ def write_csv_clifor(csv_filename: str, header: List[str], content: List[List[st
             for row in content:
                 writer.writerow(row)
     except Exception as e:
-        print(f"Errore nella scrittura del file {csv_filename}: {e}")
+        log(f"Errore nella scrittura del file {csv_filename}: {e}")
    
 def flatten_xml(element) -> Dict[str, str]:
     """Flattens XML elements into a flat dictionary, warning on duplicate keys."""
@@ -121,63 +133,130 @@ def flatten_xml(element) -> Dict[str, str]:
             result[child.tag] = child.text or ""
     return result
 
-def read_xml_scad(xml_filename: str, manual_scad: bool = False, data_manual: str = None) -> Tuple[int, Dict[str, str], Dict[str, str], Dict[str, str], Dict[str, str], Dict[str, str]]:
+class _AttachmentSkipper:
+    """
+    File-like wrapper used as source for iterparse: it copies the XML as it is
+    but drops the base64 content of the <Attachment> elements (PDF copies in
+    Allegati), so the parser never builds those text nodes. The base64 text
+    has no '<', so the content ends at the first '<' after the opening tag.
+    """
+    OPEN_TAG = b"<Attachment"
+
+    def __init__(self, raw, chunk_size=1 << 16, digest=None):
+        self.raw = raw
+        self.chunk_size = chunk_size
+        self.digest = digest  # hashlib opzionale, aggiornato con i byte originali
+        self.pending = b""
+        self.state = "copy"  # copy | tag (dentro <Attachment ...>) | skip
+        self.last_tag_byte = b""
+
+    def read(self, size=-1):
+        while True:
+            chunk = self.raw.read(self.chunk_size)
+            if not chunk:
+                data, self.pending = self.pending, b""
+                return data
+            if self.digest is not None:
+                self.digest.update(chunk)
+            data = self._filter(chunk)
+            if data:
+                return data
+
+    def drain(self):
+        # legge il resto del file, così l'hash comprende tutto il contenuto
+        for chunk in iter(lambda: self.raw.read(self.chunk_size), b""):
+            if self.digest is not None:
+                self.digest.update(chunk)
+
+    def _filter(self, chunk):
+        buf = self.pending + chunk
+        self.pending = b""
+        out = []
+        while buf:
+            if self.state == "copy":
+                idx = buf.find(self.OPEN_TAG)
+                if idx < 0:
+                    # tiene da parte la coda, potrebbe essere l'inizio del tag
+                    cut = max(0, len(buf) - len(self.OPEN_TAG) + 1)
+                    out.append(buf[:cut])
+                    self.pending = buf[cut:]
+                    break
+                end = idx + len(self.OPEN_TAG)
+                out.append(buf[:end])
+                buf = buf[end:]
+                self.state = "tag"
+            elif self.state == "tag":
+                idx = buf.find(b">")
+                if idx < 0:
+                    out.append(buf)
+                    self.last_tag_byte = buf[-1:]
+                    break
+                closing = buf[idx - 1:idx] if idx else self.last_tag_byte
+                out.append(buf[:idx + 1])
+                buf = buf[idx + 1:]
+                self.state = "copy" if closing == b"/" else "skip"
+            else:
+                idx = buf.find(b"<")
+                if idx < 0:
+                    break
+                buf = buf[idx:]
+                self.state = "copy"
+        return b"".join(out)
+
+# elementi su cui si ferma iterparse: le sezioni dello schema contengono i
+# dati, gli altri servono solo per liberare memoria man mano che il file
+# viene letto
+_STREAM_TAGS = tuple({section.tag for section in SECTIONS.values()}) + (
+    "DettaglioLinee", "Allegati", "FatturaElettronicaHeader", "FatturaElettronicaBody")
+
+def read_xml_scad_stream(xml_filename, digest=None, log=print) -> Tuple[int, Dict[str, str], Dict[str, str], Dict[str, str], Dict[str, str], Dict[str, str]]:
+    """
+    Read the deadline fields of an invoice (see fattura_schema.py). The file is
+    read with iterparse and every element is cleared once used, so memory does not grow
+    with DettaglioLinee or Allegati. The file is never modified: a payment
+    without DataScadenzaPagamento is returned without it (see overrides.py).
+    xml_filename can also be a binary file object (e.g. a ZIP member).
+    If digest (hashlib object) is given, it is updated with the file content.
+    A file that cannot be read is reported with log(message).
+    """
     try:
-        tree = ET.parse(xml_filename)
-        root = tree.getroot()
-
-        ret_pag, ret_ana, ret_doc, ret_imp, ret_ana_cess = {}, {}, {}, {}, {}
-
-        # Cedente/Prestatore
-        cedente = root.find('FatturaElettronicaHeader/CedentePrestatore/DatiAnagrafici')
-        if cedente is not None:
-            ret_ana.update(flatten_xml(cedente))
-        ret_ana.setdefault("Denominazione", ret_ana.get("Cognome", "Sconosciuto"))
-
-        # Documento
-        doc = root.find('FatturaElettronicaBody/DatiGenerali/DatiGeneraliDocumento')
-        if doc is not None:
-            ret_doc.update(flatten_xml(doc))
-
-        # Pagamenti
-        pagamenti = root.findall('FatturaElettronicaBody/DatiPagamento/DettaglioPagamento')
-        modificato = False
-
-        for i, pagamento in enumerate(pagamenti, start=1):
-            for elem in pagamento:
-                ret_pag[f"{elem.tag}{i}"] = elem.text or ""
+        sections = {name: {} for name in SECTIONS}
+        seen = set()
+        num_pag = 0
 
-            if f"DataScadenzaPagamento{i}" not in ret_pag:
-                scadenza = add_scad(ret_doc, ret_ana, manual_scad, data_manual)
-                if scadenza is None:
-                    return None
-                ET.SubElement(pagamento, "DataScadenzaPagamento").text = scadenza
-                modificato = True
-
-            for elem in pagamento:
-                ret_pag[f"{elem.tag}{i}"] = elem.text or ""
-
-        if modificato:
-            tree.write(xml_filename, encoding="utf-8", xml_declaration=True)
-
-        # Importi
-        importi = root.findall('FatturaElettronicaBody/DatiBeniServizi/DatiRiepilogo')
-        for imp in importi:
-            ret_imp.update(flatten_xml(imp))
-
-        # Cessionario/Committente
-        cessionario = root.find('FatturaElettronicaHeader/CessionarioCommittente/DatiAnagrafici')
-        if cessionario is not None:
-            temp = flatten_xml(cessionario)
-            ret_ana_cess.update({f"F{k}": v for k, v in temp.items()})
-
-        return len(pagamenti), ret_pag, ret_ana, ret_doc, ret_imp, ret_ana_cess
+        if hasattr(xml_filename, "read"):
+            opened = contextlib.nullcontext(xml_filename)
+        else:
+            opened = open(xml_filename, "rb")
+        with opened as raw:
+            source = _AttachmentSkipper(raw, digest=digest)
+            for _, elem in ET.iterparse(source, events=("end",), tag=_STREAM_TAGS):
+                parent = elem.getparent()
+                section = SECTIONS_BY_TAG.get((parent.tag, elem.tag)) if parent is not None else None
+
+                if section is None:
+                    pass
+                elif section.mode == "each":
+                    num_pag += 1
+                    section.extract(elem, sections[section.name], str(num_pag))
+                elif section.mode == "merge" or section.name not in seen:
+                    section.extract(elem, sections[section.name])
+                    seen.add(section.name)
+
+                elem.clear(keep_tail=True)
+                while parent is not None and elem.getprevious() is not None:
+                    del parent[0]
+            source.drain()
+
+        for section in SECTIONS.values():
+            section.finish(sections[section.name])
+        return (num_pag,) + tuple(sections[name] for name in SCAD_SECTIONS)
 
     except Exception as e:
-        print(f"Errore nella lettura del file XML: {e}")
+        log(f"Errore nella lettura del file XML: {e}")
         return 0, {}, {}, {}, {}, {}
 
-def read_year() -> Dict[str, List[int] | str]:
+def read_year(log=print) -> Dict[str, List[int] | str]:
     year = {"active": "", "available": []}
     try:
         with (CONFIG_DIR / "year.csv").open("r", newline="", encoding="utf-8") as f:
@@ -193,7 +272,7 @@ def read_year() -> Dict[str, List[int] | str]:
                 ]
                 year["available"] = available_list
     except Exception as e:
-        print(f"Errore nella lettura del file year.csv: {e}")
+        log(f"Errore nella lettura del file year.csv: {e}")
     return year
 
 def write_yearOld(year: Dict[str, List[str] | str]) -> Dict[str, str]:
@@ -212,8 +291,8 @@ def write_yearOld(year: Dict[str, List[str] | str]) -> Dict[str, str]:
     return updated
     
 
-def write_year(year) -> Dict[str, str]:
-    existing = read_year()
+def write_year(year, log=print) -> Dict[str, str]:
+    existing = read_year(log)
 
     # Normalizza l'input
     active = year.get("active", existing["active"])
@@ -242,6 +321,6 @@ def write_year(year) -> Dict[str, str]:
             writer.writeheader()
             writer.writerow(updated)
     except Exception as e:
-        print(f"Errore nella scrittura del file year.csv: {e}")
+        log(f"Errore nella scrittura del file year.csv: {e}")
 
     return updated
\ No newline at end of file
@@ -8,10 +8,95 @@
 # version ............ 0.6.0
 
 import models.readwrite_csv_xml as rwxml
-import glob
+import hashlib
+import multiprocessing
 import os
-from datetime import datetime
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from tabulate import tabulate
+from config.constants import XML_WORKERS
+import models.sources as sources
+from models.manifest import IngestManifest
+from models.overrides import DeadlineOverrides
+from models.aggregate import MonthlyTotals
+import models.datecodec as datecodec
+from models.fattura_schema import CSV_COLUMNS, SCAD_SECTIONS, column_value
+
+def read_xml_entry(source):
+    # eseguita anche nei processi del pool: legge la fattura (file o membro di
+    # un archivio ZIP) e ne calcola l'impronta (dimensione, mtime, sha1) nello
+    # stesso passaggio. Non stampa nulla: l'eventuale errore è restituito
+    # (scad, impronta, messaggio o None) e riportato da chi legge
+    errors = []
+    try:
+        size, stamp = sources.source_stat(source)
+        digest = hashlib.sha1()
+        with sources.open_source(source) as raw:
+            scad = rwxml.read_xml_scad_stream(raw, digest, errors.append)
+    except (OSError, zipfile.BadZipFile) as e:
+        return (0, {}, {}, {}, {}, {}), None, f"Errore nella lettura del file XML: {e}"
+    error = errors[-1] if errors else None
+    if any(scad[1:]):
+        return scad, (size, stamp, digest.hexdigest()), error
+    # lettura fallita: l'hash potrebbe essere parziale, lo ricalcola
+    try:
+        return scad, sources.source_fingerprint(source), error
+    except OSError:
+        return scad, None, error
+
+def _pool_context():
+    # processi del pool senza fork del processo corrente: la lettura parte
+    # anche da un thread (IngestJob) mentre girano interfaccia, watcher e
+    # prefetch, e il fork di un processo con più thread può bloccare i figli
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+class IngestCancelled(Exception):
+    """Reading of the invoices stopped by the user (see ScadDati.read_xml)."""
+
+CSV_HEADER = tuple(column[0] for column in CSV_COLUMNS)
+_DATE_COLUMNS = [i for i, column in enumerate(CSV_COLUMNS) if column[3] == "date"]
+
+def scad_to_rows(scad):
+    """
+    Rows of the CSV file (one per deadline) for the result of read_xml_scad_stream,
+    with the columns of CSV_COLUMNS. Dates are yyyymmdd codes (datecodec), to
+    sort the rows before format_row_dates.
+    """
+    if not scad:
+        return []  # scadenza mancante non impostata (manual_scad)
+    scad_sections = dict(zip(SCAD_SECTIONS, scad[1:]))
+    rows = []
+    for i in range(1, scad[0] + 1):
+        row = []
+        for column in CSV_COLUMNS:
+            value = column_value(scad_sections, column, i)
+            if column[3] == "date":
+                value = datecodec.parse_iso(value)  # intero yyyymmdd
+            elif column[3] == "amount":
+                value = f"{value:.2f}"
+            row.append(value)
+        rows.append(row)
+    return rows
+
+def format_row_dates(row):
+    # date nel formato dei file CSV
+    for i in _DATE_COLUMNS:
+        row[i] = datecodec.format_date(row[i])
+    return row
+
+def _batched(iterable, size):
+    # blocchi di al massimo size elementi, senza costruire l'intera lista
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
 
 class ScadDati:
     '''
@@ -20,22 +105,35 @@ class ScadDati:
     payment schedule software. It basically extracts the deadline data and makes 
     it available to lists and dictionaries.
     '''
+    READ_BATCH = 2000  # file letti per blocco (manifest e pool di processi)
 
     def __init__(self, xml_file_pathname=""):
         '''
-        xml_file_pathname può essere il percorso di un singolo file XML
-        oppure una directory contenente più file XML.
+        xml_file_pathname può essere il percorso di un singolo file XML, di un
+        archivio ZIP oppure una directory (letta anche nelle sottodirectory)
+        contenente file XML e/o archivi ZIP, o una lista di questi percorsi.
+        I file dentro gli archivi sono letti senza estrarli su disco.
         '''
-        self.xml_filename = self._resolve_path(xml_file_pathname)
+        self.source_paths = self._resolve_paths(xml_file_pathname)
+        self.xml_filename = self.source_paths[0]
         self.scad_all = []
+        self.rows = []
+        self.throughput = 0.0
+        self.errors = 0        # fatture non leggibili dell'ultima lettura
+        self.years = set()
+        self.overrides = None  # scadenze aggiunte, condivise dai due lati
+        self._pending = []     # scritture rimandate a commit()
 
-    def _resolve_path(self, path):
-        if os.path.isfile(path):
-            return path
-        elif os.path.isdir(path):
-            return os.path.join(path, '*.xml')
-        else:
-            raise ValueError(f"Percorso non valido: {path}")
+    def _resolve_paths(self, paths):
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        paths = [os.fspath(path) for path in paths if path]
+        if not paths:
+            raise ValueError("Percorso non valido: nessun percorso indicato")
+        for path in paths:
+            if not (os.path.isfile(path) or os.path.isdir(path)):
+                raise ValueError(f"Percorso non valido: {path}")
+        return paths
     
     def change_file(self, xml_file_pathname):
         '''
@@ -43,9 +141,11 @@ class ScadDati:
         selecting a vendor invoice path and in the same instance switching to
         customer invoices.
         '''
-        self.xml_filename = self._resolve_path(xml_file_pathname)
+        self.source_paths = self._resolve_paths(xml_file_pathname)
+        self.xml_filename = self.source_paths[0]
 
-    def read_xml(self, manual_scad=False, data_manual=None):
+    def read_xml(self, manual_scad=False, data_manual=None, workers=None, manifest_filename=None,
+                 overrides_filename=None, progress=None, cancel=None, save=True, log=print):
         '''
         return list of all invoice scadence. Every element of list is dictionary
         with this format: {'ModalitaPagamento1': 'MP12', 
@@ -53,32 +153,176 @@ class ScadDati:
         If arg manual_scad is True and data_manual is set, in case of deadline 
         data not present, will be request manual insert, otherwise an alert will
         be generated and the invoice date will be considered deadline. See 
-        add_scad.py for details.
+        add_scad.py for details. The XML files are never modified: the added
+        deadlines are kept in the sidecar store overrides_filename (see
+        overrides.py), or only in memory if it is None.
+        workers is the number of processes used to parse the files (None uses
+        XML_WORKERS from config, 0 all available cores, 1 sequential reading).
+        Results keep the order of discovery of the files (see
+        sources.iter_sources), so the output of xml_to_csv does not depend on
+        the number of workers. Files are discovered lazily and read in batches
+        of READ_BATCH.
+        If manifest_filename is set, only new or changed files are parsed; the
+        others are taken from the manifest (see manifest.py), and files no
+        longer present are dropped from it.
+        Files with the same content (same invoice in two archives, or both in
+        an archive and in the directory) are read only once.
+        progress(done, total, errors) is called after every file read (the
+        files are listed first, to know total). If cancel (a threading.Event)
+        is set, reading stops with IngestCancelled and nothing is saved.
+        With save=False manifest and added deadlines are saved only by
+        commit(), so a run can still be discarded after reading.
+        Messages (unreadable files, counts at the end) are passed to log,
+        print by default; nothing is printed by the worker processes.
         '''
+        manifest = IngestManifest(manifest_filename, log) if manifest_filename else None
+        # scadenze mancanti: lette dal file sidecar o calcolate, mai scritte
+        # nell'XML; lo stesso archivio serve i due lati della contabilizzazione
+        overrides_filename = str(overrides_filename) if overrides_filename else None
+        if self.overrides is None or self.overrides.filename != overrides_filename:
+            self.overrides = DeadlineOverrides(overrides_filename, log)
+        overrides = self.overrides
+        workers = XML_WORKERS if workers is None else workers
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+
         self.scad_all = []
-        for file_path in glob.glob(self.xml_filename):
-            scad_temp = rwxml.read_xml_scad(file_path, manual_scad, data_manual)
-            self.scad_all.append(scad_temp)
+        seen_sources = set()
+        seen_sha1 = set()
+        num_read = duplicates = 0
+        done = errors = 0
+        source_list = sources.iter_sources(self.source_paths, log=log)
+        total = None
+        if progress is not None:
+            source_list = list(source_list)
+            total = len(source_list)
+            progress(done, total, errors)
+        pool = None
+        start = time.perf_counter()
+        try:
+            for batch in _batched(source_list, self.READ_BATCH):
+                seen_sources.update(batch)
+                to_read = manifest.changed_files(batch) if manifest else batch
+                if pool is None and workers > 1 and len(to_read) >= 2 * workers:
+                    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+                results = {}
+                for file_path, result in zip(to_read, self._parse_files(to_read, pool, workers)):
+                    results[file_path] = result
+                    if result[2]:
+                        # solo le letture fallite: una fattura senza
+                        # pagamenti è letta correttamente
+                        errors += 1
+                        log(result[2])
+                    if cancel is not None and cancel.is_set():
+                        raise IngestCancelled()
+                    if progress is not None:
+                        progress(done + len(results), total, errors)
+                num_read += len(to_read)
+
+                for file_path in batch:
+                    if file_path in results:
+                        scad, fingerprint, error = results[file_path]
+                        sha1 = fingerprint[2] if fingerprint else ""
+                        # un file non leggibile non entra nel manifest: è
+                        # riletto (e segnalato) alla prossima contabilizzazione
+                        if manifest and fingerprint is not None and not error:
+                            manifest.update(file_path, scad, fingerprint)
+                    else:
+                        scad, sha1 = manifest.scad(file_path), manifest.sha1(file_path)
+                    if sha1 in seen_sha1:
+                        duplicates += 1
+                        continue
+                    if sha1:
+                        seen_sha1.add(sha1)
+                    self.scad_all.append(overrides.apply(scad, sha1, file_path, manual_scad, data_manual))
+                done += len(batch)
+                if progress is not None:
+                    progress(done, total, errors)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        self.errors = errors
+        removed = 0
+        if manifest:
+            removed = manifest.prune(seen_sources)
+            self._save(manifest.save, save)
+        self._save(partial(overrides.save, log), save)
+        elapsed = time.perf_counter() - start
+
+        self.throughput = num_read / elapsed if elapsed > 0 else 0.0
+        log(f"Lette {len(seen_sources)} fatture XML ({num_read} nuove o modificate, "
+              f"{removed} rimosse, {duplicates} duplicate) in {elapsed:.2f} s "
+              f"({self.throughput:.1f} file/s)")
         return self.scad_all
 
+    def _parse_files(self, files, pool, workers):
+        # risultati restituiti man mano, per l'avanzamento e l'annullamento
+        if pool is not None and len(files) >= 2 * workers:
+            # pool.map restituisce i risultati nell'ordine dei file in ingresso
+            chunksize = max(1, len(files) // (workers * 4))
+            return pool.map(read_xml_entry, files, chunksize=chunksize)
+        return (read_xml_entry(file_path) for file_path in files)
+
+    def _save(self, write, save):
+        if save:
+            write()
+        else:
+            self._pending.append(write)
+
+    def commit(self):
+        """Do the writes postponed by read_xml/ingest with save=False."""
+        pending, self._pending = self._pending, []
+        for write in pending:
+            write()
+
+    def discard(self):
+        """Drop the postponed writes: files on disk stay as they were."""
+        self._pending = []
+
     def sniff_years(self):
         """
         Legge gli anni di scadenza dalle fatture e restituisce una lista ordinata
-        di anni unici presenti.
+        di anni unici presenti. Se le fatture sono già state lette usa i dati in
+        memoria, senza rileggere i file XML.
         """
-        dati = self.read_xml()
+        dati = self.scad_all if self.scad_all else self.read_xml()
         anni = {
             int(valore[:4])
             for elemento in dati
+            if elemento
             for sotto_dizionario in elemento
             if isinstance(sotto_dizionario, dict)
             for chiave, valore in sotto_dizionario.items()
             if chiave.startswith("DataScadenzaPagamento")
         }
         return sorted(anni)
-    
-    def write_years_csv(self, year_act, year_avl):
-        rwxml.write_year ({"active": year_act, "available": year_avl})
+
+    def ingest(self, csv_filename, manifest_filename=None, overrides_filename=None,
+               manual_scad=False, data_manual=None, workers=None, progress=None, cancel=None,
+               save=True, log=print):
+        """
+        Single pass over the XML files: reads the invoices, writes the CSV and
+        returns a summary with the deadline years and the counts, like:
+        {"files": 120, "invoices": 118, "deadlines": 190, "errors": 2,
+        "years": [2024, 2025], "throughput": 850.3}
+        progress, cancel, save and log as in read_xml (with save=False also
+        the CSV file is written by commit()).
+        """
+        self.read_xml(manual_scad, data_manual, workers, manifest_filename, overrides_filename,
+                      progress, cancel, save, log)
+        deadlines = self.xml_to_csv(csv_filename, save, log)
+        return {
+            "files": len(self.scad_all),
+            "invoices": len(self.scad_all) - self.errors,
+            "deadlines": deadlines,
+            "errors": self.errors,
+            "years": sorted(self.years),
+            "throughput": self.throughput
+        }
+
+    def write_years_csv(self, year_act, year_avl, log=print):
+        rwxml.write_year ({"active": year_act, "available": year_avl}, log)
     
     def sniff_years_old(self):
         """
@@ -99,49 +343,33 @@ class ScadDati:
         anni_unici = sorted({int(data[:4]) for data in date_scadenza})
         return (anni_unici)
    
-    def xml_to_csv(self, filename):
-        def format_date(date_str):
-            return datetime.strptime(date_str, '%Y-%m-%d')
-
-        header = [["Denominazione", "IdCodice", "TipoDocumento", "Numero", 
-                   "Data", "ImportoTotaleDocumento", "DataScadenzaPagamento",
-                   "ImportoPagamento", "ModalitaPagamento", "Cessionario",
-                   "IdCodiceCess"]]
-        
+    def xml_to_csv(self, filename, save=True, log=print):
+        # colonne dichiarate in fattura_schema.CSV_COLUMNS
+        header = [list(CSV_HEADER)]
+        invoice_col = CSV_HEADER.index("Data")
+        scad_col = CSV_HEADER.index("DataScadenzaPagamento")
+
         content = []
 
         for scad in self.scad_all:
-            num_scad = scad[0]
-            for i in range(num_scad):
-                invoice_dt = format_date(scad[3]["Data"])
-                scad_dt = format_date(scad[1][f"DataScadenzaPagamento{i+1}"])
-                importo_totale = float(scad[4]['ImponibileImporto']) + float(scad[4]['Imposta'])
-                importo_pagamento = float(scad[1][f'ImportoPagamento{i+1}'])
-
-                content.append([
-                    scad[2]["Denominazione"],
-                    scad[2]["IdCodice"],
-                    scad[3]["TipoDocumento"],
-                    scad[3]["Numero"],
-                    invoice_dt,  # oggetto datetime
-                    f"{importo_totale:.2f}",
-                    scad_dt,      # oggetto datetime
-                    f"{importo_pagamento:.2f}",
-                    scad[1][f"ModalitaPagamento{i+1}"],
-                    scad[5]["FDenominazione"],
-                    scad[5]["FIdCodice"]
-                ])
-
-        # Ordina usando datetime, poi formatta le date
-        content.sort(key=lambda x: (x[6], x[4]))  # x[6] = scad_dt, x[4] = invoice_dt
+            content.extend(scad_to_rows(scad))
+
+        # Ordina usando i codici delle date, poi formatta le date
+        content.sort(key=lambda x: (x[scad_col], x[invoice_col]))
+
+        # anni delle scadenze, raccolti nello stesso passaggio
+        self.years = {datecodec.year(row[scad_col]) for row in content}
 
         # Converti le date in stringa dopo l'ordinamento
         for row in content:
-            row[4] = row[4].strftime('%d-%m-%Y')  # invoice_dt
-            row[6] = row[6].strftime('%d-%m-%Y')  # scad_dt
+            format_row_dates(row)
+        self.rows = content
 
-        rwxml.write_csv_clifor(filename, header, content)
-        print(f"File CSV '{filename}' creato con successo e ordinato correttamente!")
+        def write():
+            rwxml.write_csv_clifor(filename, header, content, log)
+            log(f"File CSV '{filename}' creato con successo e ordinato correttamente!")
+        self._save(write, save)
+        return len(content)
             
     def xml_to_txt(self, output_file="dati.txt"):
         '''
@@ -179,6 +407,7 @@ class ViewScadGen:
     
     def __init__(self, csv_filename=""):
         self.csv_file = csv_filename
+        self._totals = None
 
     def change_file(self, csv_filename):
         '''
@@ -187,6 +416,17 @@ class ViewScadGen:
         customer invoices.
         '''
         self.csv_file = csv_filename
+        self._totals = None
+
+    def totals(self):
+        '''
+        read CSV file once and return the MonthlyTotals of all years; the
+        result is kept until change_file, so changing year does not read the
+        file again.
+        '''
+        if self._totals is None:
+            self._totals = MonthlyTotals(rwxml.read_csv_raw(self.csv_file))
+        return self._totals
 
     def scad_cli_for(self, year):
         '''
@@ -203,22 +443,8 @@ class ViewScadGen:
         # ScadenzaPagamento"], "%d-%m-%Y") == data_limite]
         ########################################################################
 
-        # read file
-        list_reader = rwxml.read_csv_raw(self.csv_file)
-        total_month = []
-        select_month = 1
-        total_month = []
-        for mese in range(1, 13):
-            dati_filtrati = [
-                riga for riga in list_reader
-                if datetime.strptime(riga["DataScadenzaPagamento"], "%d-%m-%Y").month == mese
-                and datetime.strptime(riga["DataScadenzaPagamento"], "%d-%m-%Y").year == year
-            ]
-            totale = sum(float(r["ImportoPagamento"]) for r in dati_filtrati)
-            total_month.append(f"{totale:.2f}")
-
-        return total_month
-        
+        return self.totals().year(year)
+
     def txt_view(self, data_supplier=[], data_customer=[]):
         # test function
         data_supplier.insert(0, "Fornitori")
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# file name .......... sources.py
+# scope .............. sources of the XML invoices: single files, directories
+# .................... and members of ZIP archives read without extracting
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import fnmatch
+import hashlib
+import os
+import zipfile
+from functools import lru_cache
+from config.constants import XML_INCLUDE, XML_EXCLUDE
+
+# separatore tra archivio e nome del file interno, es.: "/fatture/q1.zip::IT01_a1.xml"
+ZIP_MEMBER_SEP = "::"
+
+def is_zip(path):
+    return str(path).lower().endswith(".zip")
+
+def is_xml(name):
+    return name.lower().endswith(".xml")
+
+def split_member(source):
+    """Return (archive, member) for a ZIP member, (source, None) for a file."""
+    archive, sep, member = source.partition(ZIP_MEMBER_SEP)
+    return (archive, member) if sep else (source, None)
+
+@lru_cache(maxsize=8)
+def _open_archive(archive, mtime_ns, size, pid):
+    # un solo ZipFile aperto per archivio e per processo: la chiave comprende il
+    # pid (i processi del pool non devono condividere la posizione nel file) e
+    # mtime/dimensione, così un archivio sostituito viene riaperto
+    return zipfile.ZipFile(archive)
+
+def open_archive(archive):
+    stat = os.stat(archive)
+    return _open_archive(archive, stat.st_mtime_ns, stat.st_size, os.getpid())
+
+def list_zip_members(archive, log=print):
+    """Sources of the XML files inside a ZIP archive, in name order."""
+    try:
+        names = [info.filename for info in open_archive(archive).infolist()
+                 if not info.is_dir() and is_xml(info.filename)]
+    except (OSError, zipfile.BadZipFile) as e:
+        log(f"Errore nella lettura dell'archivio {archive}: {e}")
+        return []
+    return [f"{archive}{ZIP_MEMBER_SEP}{name}" for name in sorted(names)]
+
+def matches(name, patterns):
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(name, pattern.lower()) for pattern in patterns)
+
+def _walk(directory, include, exclude, log):
+    # visita ricorsiva con os.scandir: legge una directory alla volta, in
+    # ordine di nome, e restituisce i percorsi man mano (generatore)
+    try:
+        with os.scandir(directory) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError as e:
+        log(f"Errore nella lettura della directory {directory}: {e}")
+        return
+    for entry in entries:
+        if matches(entry.name, exclude):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path, include, exclude, log)
+            elif entry.is_file() and matches(entry.name, include):
+                if is_zip(entry.name):
+                    yield from list_zip_members(entry.path, log)
+                else:
+                    yield entry.path
+        except OSError:
+            continue
+
+def iter_sources(roots, include=XML_INCLUDE, exclude=XML_EXCLUDE, log=print):
+    """
+    Yield lazily the sources found in roots (a path or a list of paths). A
+    root can be a XML file, a ZIP archive (its XML members) or a directory,
+    visited recursively. include/exclude are file name patterns (fnmatch,
+    case insensitive, so "*.xml" also matches ".XML"); exclude patterns also
+    skip directories. The order is deterministic: roots in the given order,
+    then names in alphabetical order. Unreadable directories and archives
+    are skipped and reported with log(message).
+    """
+    if isinstance(roots, (str, os.PathLike)):
+        roots = [roots]
+    for root in roots:
+        root = os.fspath(root)
+        if os.path.isdir(root):
+            yield from _walk(root, include, exclude, log)
+        elif is_zip(root):
+            yield from list_zip_members(root, log)
+        elif os.path.isfile(root):
+            yield root
+
+def open_source(source):
+    """Open a source (file or ZIP member) as a binary file object."""
+    archive, member = split_member(source)
+    if member is None:
+        return open(source, "rb")
+    return open_archive(archive).open(member)
+
+def source_stat(source):
+    """
+    Return (size, stamp) of a source: stamp is mtime_ns for files and the
+    CRC32 for ZIP members, read from the archive directory without
+    decompressing.
+    """
+    archive, member = split_member(source)
+    if member is None:
+        stat = os.stat(source)
+        return stat.st_size, stat.st_mtime_ns
+    try:
+        info = open_archive(archive).getinfo(member)
+    except KeyError:
+        raise FileNotFoundError(source)
+    return info.file_size, info.CRC
+
+def source_fingerprint(source, block_size=1 << 20):
+    """
+    Return (size, stamp, sha1) of the source. The hash is calculated on the
+    content, so a file touched without changes keeps the same sha1.
+    """
+    size, stamp = source_stat(source)
+    digest = hashlib.sha1()
+    with open_source(source) as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return size, stamp, digest.hexdigest()
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# file name .......... summary.py
+# scope .............. materialized summary of the deadlines: monthly totals and
+# .................... row counts per side, read at startup without the rows
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import json
+import models.readwrite_csv_xml as rwxml
+from models.aggregate import MonthlyTotals
+
+class DeadlineSummary:
+    '''
+    Summary of the deadlines written by the ingestion (and updated in watch
+    mode), saved in JSON in data_box: for every side the monthly totals in
+    cents and the number of deadlines of every year, with the counter of
+    changes of the archive (InvoiceStore.changes) they were calculated at,
+    in this format:
+    {"version": 2, "sides": {"suppliers": {"changes": 3,
+    "years": {"2025": {"cents": [12 totali], "rows": [12 conteggi]}}}}}
+    The totals of a side are valid while its rows in the archive do not
+    change: the CSV files are not read.
+    '''
+    VERSION = 2
+
+    def __init__(self, summary_filename, log=print):
+        self.filename = str(summary_filename)
+        self.sides = {}
+        self.dirty = False  # modificato dopo l'ultima lettura o scrittura
+        self.load(log)
+
+    def load(self, log=print):
+        try:
+            with open(self.filename, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.sides = data["sides"] if data.get("version") == self.VERSION else {}
+        except FileNotFoundError:
+            self.sides = {}
+        except (ValueError, KeyError, AttributeError, OSError) as e:
+            log(f"Riepilogo scadenze non leggibile, verrà ricreato: {e}")
+            self.sides = {}
+        return self.sides
+
+    def save(self):
+        with rwxml.atomic_write(self.filename) as f:
+            json.dump({"version": self.VERSION, "sides": self.sides}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        self.dirty = False
+
+    def set_side(self, side, totals, changes):
+        """Replace the totals (MonthlyTotals) of side, calculated at changes."""
+        self.sides[side] = {"changes": changes, "years": totals.to_dict()}
+        self.dirty = True
+
+    def add(self, side, totals, changes):
+        """
+        Add totals (e.g. of the invoices arrived in watch mode, less those of
+        the rows replaced) to side, whose rows have just been changed in the
+        archive to the counter changes. If the summary of side was not up to
+        date before that change, it is left as it is (no longer valid).
+        """
+        entry = self.sides.get(side)
+        if entry is not None and entry.get("changes") == changes - 1:
+            entry["years"] = MonthlyTotals.from_dict(entry["years"]).merge(totals).to_dict()
+            entry["changes"] = changes
+            self.dirty = True
+
+    def totals(self, side, changes):
+        """
+        MonthlyTotals of side, or None if missing or no longer valid (the
+        counter of changes of the archive is not changes any more).
+        """
+        entry = self.sides.get(side)
+        if entry is None or entry.get("changes") != changes:
+            return None
+        try:
+            return MonthlyTotals.from_dict(entry["years"])
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return None
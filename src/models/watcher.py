@@ -0,0 +1,250 @@
+#!/usr/bin/python3
+# file name .......... watcher.py
+# scope .............. watch the invoice directories and read the new XML
+# .................... files in background (inotify on Linux, polling elsewhere)
+# language ........... Python 3.11.2
+# author ............. Stefano Alemani
+# date ............... 18-10-2026
+# version ............ 0.6.0
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import lxml.etree as ET
+import models.sources as sources
+from models.scadenz import read_xml_entry, scad_to_rows, format_row_dates
+from models.manifest import IngestManifest
+from models.overrides import DeadlineOverrides
+from config.constants import XML_INCLUDE, XML_EXCLUDE
+
+# costanti di <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+class _Inotify:
+    '''Minimal inotify binding with ctypes (Linux only).'''
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.watches = {}  # wd -> directory
+
+    def add_watch(self, directory):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[wd] = directory
+        return wd
+
+    def read_events(self, timeout):
+        """Return a list of (path, mask) after at most timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            directory = self.watches.get(wd)
+            if directory is not None:
+                events.append((os.path.join(directory, os.fsdecode(name)), mask))
+            elif mask & IN_Q_OVERFLOW:
+                events.append(("", mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher(threading.Thread):
+    '''
+    Background thread that watches the invoice directories of both sides and
+    reads the new XML files (or ZIP archives) as soon as they arrive, or are
+    rewritten. For each batch it calls on_rows(side, rows, replaced) from its
+    own thread, with rows (new deadlines) and replaced (deadlines of the
+    rewritten files, to remove) in the format of the CSV files; a file that
+    cannot be read is skipped and on_error(message) is called (printed if
+    on_error is None). Both are called from this thread: the caller must
+    move them to the interface thread (see ControllerW.start_watch).
+    roots: {"suppliers": [percorsi], "clients": [percorsi]}
+    Uses inotify on Linux and falls back to polling every interval seconds.
+    '''
+
+    def __init__(self, roots, on_rows, manifest_filenames=None, overrides_filename=None,
+                 interval=2.0, on_error=None):
+        super().__init__(name="scadenzade-watcher", daemon=True)
+        self.roots = {side: [os.path.abspath(path) for path in paths if os.path.isdir(path)]
+                      for side, paths in roots.items()}
+        self.on_rows = on_rows
+        self.on_error = on_error
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._reported = set()  # errori già segnalati dal polling
+        self.overrides = DeadlineOverrides(overrides_filename, self._report)
+
+        # sorgenti già contabilizzate (percorso -> sha1 e dati letti, dai
+        # manifest): una fattura riscritta sostituisce le sue righe, e i
+        # contenuti già letti in un altro percorso non vengono aggiunti due volte
+        self.known = {}
+        self.seen_sha1 = set()
+        for manifest_filename in (manifest_filenames or {}).values():
+            manifest = IngestManifest(manifest_filename, self._report)
+            for path in manifest.entries:
+                self.known[path] = (manifest.sha1(path), manifest.scad(path))
+                self.seen_sha1.add(manifest.sha1(path))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            inotify = _Inotify()
+        except (OSError, AttributeError):
+            self._run_polling()
+            return
+        try:
+            self._run_inotify(inotify)
+        finally:
+            inotify.close()
+
+    def _side_of(self, path):
+        for side, roots in self.roots.items():
+            for root in roots:
+                if os.path.commonpath([root, path]) == root:
+                    return side
+        return None
+
+    def _run_inotify(self, inotify):
+        for roots in self.roots.values():
+            for root in roots:
+                self._watch_tree(inotify, root)
+
+        while not self._stop_event.is_set():
+            arrived = {}
+            for path, mask in inotify.read_events(self.interval):
+                if mask & IN_Q_OVERFLOW:
+                    continue  # eventi persi: saranno letti al prossimo "Elabora fatture"
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # nuova directory: la osserva e legge i file già presenti
+                        self._watch_tree(inotify, path)
+                        for source in sources.iter_sources(path, log=self._report):
+                            arrived.setdefault(self._side_of(path), []).append(source)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    for source in self._sources_of_file(path):
+                        arrived.setdefault(self._side_of(path), []).append(source)
+            self._ingest(arrived)
+
+    def _watch_tree(self, inotify, directory):
+        inotify.add_watch(directory)
+        for current, dirs, _ in os.walk(directory):
+            for name in dirs:
+                inotify.add_watch(os.path.join(current, name))
+
+    def _sources_of_file(self, path):
+        name = os.path.basename(path)
+        if sources.matches(name, XML_EXCLUDE) or not sources.matches(name, XML_INCLUDE):
+            return []
+        return sources.list_zip_members(path, self._report) if sources.is_zip(path) else [path]
+
+    def _stats(self, roots):
+        stats = {}
+        for source in sources.iter_sources(roots, log=self._report_once):
+            try:
+                stats[source] = sources.source_stat(source)
+            except OSError:
+                continue
+        return stats
+
+    def _run_polling(self):
+        # le directory sono rilette a ogni giro: un archivio rovinato è segnalato
+        # una volta. Una sorgente nuova o modificata (stat diverso) è letta
+        # quando lo stat non cambia più tra due giri
+        known = {side: self._stats(roots) for side, roots in self.roots.items()}
+        pending = {}  # sorgente -> (lato, stat)
+        while not self._stop_event.wait(self.interval):
+            arrived = {}
+            for side, roots in self.roots.items():
+                for source, stat in self._stats(roots).items():
+                    if known[side].get(source) == stat:
+                        continue
+                    if pending.get(source) == (side, stat):
+                        del pending[source]
+                        known[side][source] = stat
+                        arrived.setdefault(side, []).append(source)
+                    else:
+                        pending[source] = (side, stat)
+            self._ingest(arrived)
+
+    def _report(self, message):
+        if self.on_error is not None:
+            self.on_error(message)
+        else:
+            print(message)
+
+    def _report_once(self, message):
+        if message not in self._reported:
+            self._reported.add(message)
+            self._report(message)
+
+    def _rows_of(self, scad, sha1, source):
+        # righe CSV di una fattura, come quelle scritte dalla contabilizzazione
+        scad = self.overrides.apply(scad, sha1, source)
+        return [format_row_dates(row) for row in scad_to_rows(scad)]
+
+    def _held_elsewhere(self, sha1, source):
+        return any(known_sha1 == sha1 for path, (known_sha1, _) in self.known.items()
+                   if path != source)
+
+    def _ingest(self, arrived):
+        for side, new_sources in arrived.items():
+            if side is None:
+                continue
+            rows, replaced = [], []
+            for source in new_sources:
+                try:
+                    scad, fingerprint, error = read_xml_entry(source)
+                    if error:
+                        # non leggibile (es. scritta a metà): restano le righe di prima
+                        self._report(error)
+                        continue
+                    sha1 = fingerprint[2] if fingerprint else ""
+                    old_sha1, old_scad = self.known.get(source, (None, None))
+                    if not sha1 or sha1 == old_sha1:
+                        continue  # invariata
+                    if old_sha1 is None and sha1 in self.seen_sha1:
+                        continue  # copia di una fattura già letta in un altro percorso
+                    # fattura riscritta: le sue righe vengono sostituite, tranne
+                    # se lo stesso contenuto è ancora presente in un altro percorso
+                    drop_old = old_sha1 is not None and not self._held_elsewhere(old_sha1, source)
+                    old_rows = self._rows_of(old_scad, old_sha1, source) if drop_old and old_scad else []
+                    source_rows = [] if sha1 in self.seen_sha1 else self._rows_of(scad, sha1, source)
+                except (KeyError, ValueError, ET.XMLSyntaxError) as e:
+                    # fattura incompleta o non valida: saltata, il thread continua
+                    self._report(f"fattura {os.path.basename(source)} non letta ({e!r})")
+                    continue
+                if drop_old:
+                    self.seen_sha1.discard(old_sha1)
+                self.known[source] = (sha1, scad)
+                self.seen_sha1.add(sha1)
+                rows.extend(source_rows)
+                replaced.extend(old_rows)
+            if rows or replaced:
+                self.on_rows(side, rows, replaced)
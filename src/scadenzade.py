@@ -8,9 +8,10 @@
 # data ............... 22-07-2025
 # versione ........... 0.9.0
 
+import argparse
 import urwid
 import view.main_view as view_ui
-from config.constants import PALETTE
+from config.constants import PALETTE, WATCH_FOLDERS
 import models.data_provider as data_provider
 
 class MainApp:
@@ -18,25 +19,46 @@ class MainApp:
     Classe per avviare e terminare il loop dell'applicazione. Richiama la costruzione 
     dell'interfaccia tramite MainView passando i dati e la sua istanza.
     """
-    def __init__(self, data_clients, data_suppliers, dati_table_head, run=True):
+    def __init__(self, data_clients, data_suppliers, dati_table_head, run=True, watch=False,
+                 prefetch=True):
         # richiama "view" per creare user interface
         self.main = view_ui.MainView(data_clients, data_suppliers, dati_table_head, self)
         self.loop = urwid.MainLoop(self.main, PALETTE, unhandled_input=self.exit_on_q)
+        if watch:
+            self.main.start_watch(self.loop)
+        if prefetch:
+            self.main.start_prefetch(self.loop)
         if run:
             self.run() # auto avvia l'applicazione
+        else:
+            self.main.show_lists()
 
     def run(self):
+        # le liste delle fatture sono caricate dopo il primo disegno, così i
+        # totali (dal riepilogo) compaiono subito
+        self.loop.set_alarm_in(0, self._show_lists)
         self.loop.run()
 
+    def _show_lists(self, loop, user_data=None):
+        # l'allarme scatta prima del primo disegno del MainLoop: prima i totali,
+        # poi le scadenze dell'anno attivo (ridisegnate al rientro nel loop)
+        loop.draw_screen()
+        self.main.show_lists()
+
     def exit_on_q(self, key):
         if key in ('q', 'Q'):
             raise urwid.ExitMainLoop()
 
 def main():
+    parser = argparse.ArgumentParser(prog="scadenzade")
+    parser.add_argument("--watch", action="store_true", default=WATCH_FOLDERS,
+                        help="aggiunge in tempo reale le fatture che arrivano nelle directory")
+    args = parser.parse_args()
+
     data_class = data_provider.DataProvider()
     dati = data_class.start_data()
     if dati:
-        MainApp(dati["data_clients"], dati["data_suppliers"], dati["dati_table_head"])        
+        MainApp(dati["data_clients"], dati["data_suppliers"], dati["dati_table_head"], watch=args.watch)
     else:
         print("Errore nell'inizializzazione dei dati.")
 
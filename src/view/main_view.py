@@ -12,9 +12,11 @@ import view.widget_class
 import view.popup as popup
 import control.widget_control
 import csv
-from models.data_provider import DataProvider
-from datetime import datetime
-from config.constants import SCAD_LIST_HEAD, CLI_LIST_HEAD, FOR_LIST_HEAD, YearAct
+from collections import OrderedDict
+from models.deadline_index import DeadlineIndex
+from models.deadline_table import DeadlineTable
+from models.prefetch import prefetch_order
+from config.constants import SCAD_LIST_HEAD, CLI_LIST_HEAD, FOR_LIST_HEAD, YearAct, PREFETCH_YEARS
 
 class MainView(urwid.WidgetWrap):
     def __init__(self, data_clients, data_suppliers, data_table_head, app):
@@ -26,15 +28,31 @@ class MainView(urwid.WidgetWrap):
         self.controller.rec_event("richiesta_filtro_scadenze", self.select_invoice_month_year)
         self.controller.rec_event("anno_aggiornato", self.update_year)
         self.controller.rec_event("text-statusbar", self.show_current_focus)
+        self.controller.rec_event("dati_aggiornati", self.reload_data)
 
         # Dati iniziali
         self.year_act = YearAct.YEAR_ACT
-        self.data_clients = data_clients
-        self.data_suppliers = data_suppliers
+        self.month_act = 1
+        self.watcher = None
+        self.prefetcher = None
+        self.rows_version = 0  # cambia quando arrivano nuove righe in watch
         self.data_table_head = data_table_head
+        # indici (anno, mese) -> posizioni nelle DeadlineTable di DataProvider,
+        # uno per lato e anno, caricati quando servono (_year_index): con
+        # data_clients/data_suppliers None le scadenze sono lette solo da
+        # show_lists, dopo il primo disegno dei totali. Liste e dettagli
+        # leggono le righe dalle tabelle dell'anno visualizzato
+        self.indexes = OrderedDict()  # in ordine di uso, per liberare gli anni vecchi
+        if data_clients is not None and data_suppliers is not None:
+            self.indexes[("clients", self.year_act)] = DeadlineIndex(data_clients)
+            self.indexes[("suppliers", self.year_act)] = DeadlineIndex(data_suppliers)
+            self.data_clients = self.indexes[("clients", self.year_act)].table
+            self.data_suppliers = self.indexes[("suppliers", self.year_act)].table
+        else:
+            self.data_clients, self.data_suppliers = DeadlineTable(), DeadlineTable()
 
-        self.data_clients_sel = self._select_clients(data_clients)
-        self.data_suppliers_sel = self._select_providers(data_suppliers)
+        self.data_clients_sel = self._select_clients(range(len(self.data_clients)))
+        self.data_suppliers_sel = self._select_providers(range(len(self.data_suppliers)))
 
         # Costruzione interfaccia
         self.toolbar = self._build_toolbar(app)
@@ -51,22 +69,30 @@ class MainView(urwid.WidgetWrap):
             ('pack', self.status_bar)
         ])
         self.view.focus_position = 0
-        
-        # emette evento per filtrare subito l'anno
+
+        # totali subito dal riepilogo, le liste delle fatture con show_lists
+        self.update_listbox(self.scad_list, SCAD_LIST_HEAD, data_table_head)
+        self.update_listbox(self.clients_list, CLI_LIST_HEAD, self.data_clients_sel)
+        self.update_listbox(self.suppliers_list, FOR_LIST_HEAD, self.data_suppliers_sel)
+        super().__init__(self.view)
+
+    def show_lists(self):
+        # emette evento per filtrare l'anno: carica le scadenze dell'anno attivo
         self.controller.emit_event(control.widget_control.Event(
             tipology="richiesta_filtro_scadenze",
             source=self,
             payload={"month": 1, "year": self.year_act}
         ))
-        super().__init__(self.view)
 
-    def _select_clients(self, data):
-        self.all_sel_clients_data = data
-        return [(r[8], r[1], r[2], r[3]) for r in data]
+    def _select_clients(self, positions):
+        # righe visualizzate: cliente, importo, scadenza, numero documento
+        self.all_sel_clients_data = positions
+        return self.data_clients.display_rows(positions, (8, 1, 2, 3))
 
-    def _select_providers(self, data):
-        self.all_sel_suppliers_data = data
-        return [(r[0], r[1], r[2], r[3]) for r in data]
+    def _select_providers(self, positions):
+        # righe visualizzate: fornitore, importo, scadenza, numero documento
+        self.all_sel_suppliers_data = positions
+        return self.data_suppliers.display_rows(positions, (0, 1, 2, 3))
 
     def _select_scad_list(self):
         pass
@@ -104,8 +130,61 @@ class MainView(urwid.WidgetWrap):
         box.selectedRow = 0
         box._update_highlighting()
     
+    def _year_index(self, side, year):
+        # indice dell'anno, caricato dall'archivio la prima volta che serve
+        index = self.indexes.get((side, year))
+        if index is None:
+            table = self.controller.data_provider.get_table(side, year)
+            index = DeadlineIndex(table)
+        self._keep_index(side, year, index)
+        return index
+
+    def _keep_index(self, side, year, index):
+        # memoria limitata: al massimo PREFETCH_YEARS anni oltre quello attivo,
+        # si liberano quelli usati meno di recente
+        self.indexes[(side, year)] = index
+        self.indexes.move_to_end((side, year))
+        years = list(dict.fromkeys(key_year for _, key_year in self.indexes))
+        for old_year in years[:max(0, len(years) - PREFETCH_YEARS - 1)]:
+            if old_year == self.year_act:
+                continue
+            for old_side in ("clients", "suppliers"):
+                self.indexes.pop((old_side, old_year), None)
+
+    def start_prefetch(self, loop):
+        # carica in background gli anni vicini a quello attivo
+        self.prefetcher = self.controller.start_prefetch(loop, self.on_prefetched)
+        self.schedule_prefetch()
+
+    def schedule_prefetch(self):
+        if self.prefetcher is None:
+            return
+        try:
+            center = int(self.year_act)
+        except (TypeError, ValueError):
+            return
+        years = prefetch_order(center, self.controller.get_years_available(), PREFETCH_YEARS)
+        self.prefetcher.schedule(years, self.rows_version, skip=set(self.indexes))
+
+    def on_prefetched(self, side, year, index, version):
+        # scarta gli indici letti prima dell'arrivo di nuove righe, e non
+        # sostituisce quelli già caricati
+        if version != self.rows_version or (side, year) in self.indexes:
+            return
+        self._keep_index(side, year, index)
+
     def update_year(self, evento):
         self.year_act = evento.payload.get("anno")        
+        try:
+            self.year_act = int(self.year_act)
+        except (TypeError, ValueError):
+            pass
+        else:
+            # scadenze dell'anno scelto (già pronte se caricate in background),
+            # poi il prefetch riparte attorno al nuovo anno annullando il precedente
+            for side in ("clients", "suppliers"):
+                self._year_index(side, self.year_act)
+            self.schedule_prefetch()
         self.status_bar.update_status(f"Info: selezionato anno {self.year_act}")
         # Propaga l’anno alle listbox
         self.scad_list.update_year_active(self.year_act)
@@ -140,35 +219,153 @@ class MainView(urwid.WidgetWrap):
             return
 
         # [debug] self.status_bar.update_status(f"Info: da select, {month}{year}")
-
-        def select_mese_anno(data_str):
-            try:
-                data = datetime.strptime(data_str, "%d-%m-%Y")
-                return data.month, data.year
-            except ValueError:
-                return None, None
-
-        def select_data(date, month, year):
-            if month == 1:
-                return [row for row in date if select_mese_anno(row[2])[1] == year]
-            else:
-                return [row for row in date if select_mese_anno(row[2]) == (month - 1, year)]
-        
-        data_detail_clients = select_data(self.data_clients, month, year)
-        data_detail_suppliers = select_data(self.data_suppliers, month, year)
+        self.month_act, self.year_act = month, year
+
+        # filtro con l'indice (anno, mese); month 1 è la colonna "Calcolo" e
+        # mostra tutto l'anno
+        data_provider = self.controller.data_provider
+        month_filter = None if month == 1 else month - 1
+        index_clients = self._year_index("clients", year)
+        index_suppliers = self._year_index("suppliers", year)
+        self.data_clients, self.data_suppliers = index_clients.table, index_suppliers.table
+        data_detail_clients = index_clients.positions(year, month_filter)
+        data_detail_suppliers = index_suppliers.positions(year, month_filter)
 
         data_detail_suppliers = self._select_providers(data_detail_suppliers)
         data_detail_clients = self._select_clients(data_detail_clients)
 
         # Aggiorna scad_list con dati ricalcolati per l’anno selezionato
-        self.data_table_head = DataProvider()
-        data_head = self.data_table_head._build_table_head()
-        self.update_listbox(self.scad_list, SCAD_LIST_HEAD, data_head)
+        self.data_table_head = data_provider._build_table_head(year)
+        self.update_listbox(self.scad_list, SCAD_LIST_HEAD, self.data_table_head)
 
         # Aggiorna le altre listbox
         self.update_listbox(self.clients_list, CLI_LIST_HEAD, data_detail_clients)
         self.update_listbox(self.suppliers_list, FOR_LIST_HEAD, data_detail_suppliers)
 
+    def start_watch(self, loop):
+        # modalità watch: le nuove fatture nelle directory vengono aggiunte ai dati
+        self.watcher = self.controller.start_watch(loop, self.merge_new_rows, self.on_watch_error)
+
+    def on_watch_error(self, message):
+        self.status_bar.update_status(f"Warning: {message}", "Warning")
+
+    def merge_new_rows(self, side, rows, replaced=()):
+        """
+        Add the deadlines of invoices arrived while the program is running and
+        refresh totals and lists, keeping month, year and selected rows.
+        replaced are the rows of invoices rewritten since they were read,
+        removed from the archive before adding the new ones.
+        """
+        # righe salvate nell'archivio, così totali e filtri le comprendono
+        added = self.controller.data_provider.add_rows(side, rows, replaced)
+        if added is None:
+            # archivio occupato (es. contabilizzazione in corso): nuovo tentativo
+            self.status_bar.update_status("Warning: archivio occupato, nuove scadenze in attesa", "Warning")
+            self.app.loop.set_alarm_in(1.0, lambda loop, user_data: self.merge_new_rows(side, rows, replaced))
+            return
+
+        label = "fornitori" if side == "suppliers" else "clienti"
+        if replaced:
+            # righe tolte: le tabelle crescono solo in coda, l'anno visualizzato
+            # si rilegge dall'archivio e gli altri quando servono
+            self._reload_indexes(self._shown_year())
+            self.status_bar.update_status(f"Info: scadenze aggiornate da fatture {label} modificate")
+            return
+
+        self.rows_version += 1
+        # solo gli anni già caricati: gli altri saranno letti dall'archivio
+        by_year = {}
+        for row in added:
+            by_year.setdefault(row[2] // 10000, []).append(row)
+        for year, year_rows in by_year.items():
+            index = self.indexes.get((side, year))
+            if index is not None:
+                index.add(year_rows)
+
+        self._refresh_keeping_selection()
+        self.status_bar.update_status(f"Info: {len(added)} nuove scadenze da fatture {label}")
+
+    def reload_data(self, event=None):
+        """
+        Swap in the data written by an ingestion ("Elabora fatture") without
+        restarting: the year shown is read again from the archive, totals
+        come from the new summary, the other years are dropped and loaded
+        again when needed (or by the prefetch). Year, month and selected
+        rows are kept.
+        """
+        data_provider = self.controller.data_provider
+        year = self._shown_year()
+        # la contabilizzazione imposta l'anno corrente come attivo: resta quello scelto
+        data_provider.set_year_active(year)
+        self._reload_indexes(year)
+        self.status_bar.update_status(f"Info: dati aggiornati, anno {year}")
+
+    def _shown_year(self):
+        try:
+            return int(self.year_act)
+        except (TypeError, ValueError):
+            return self.controller.data_provider.get_year_active()
+
+    def _reload_indexes(self, year):
+        # nuovi indici costruiti prima dello scambio: liste e dettagli non
+        # vedono mai dati a metà
+        data_provider = self.controller.data_provider
+        indexes = OrderedDict()
+        for side in ("clients", "suppliers"):
+            indexes[(side, year)] = DeadlineIndex(data_provider.get_table(side, year))
+        self.rows_version += 1  # scarta gli indici letti in background prima
+        self.indexes = indexes
+        self.year_act = year
+
+        self._refresh_keeping_selection()
+        self.schedule_prefetch()
+
+    def _refresh_keeping_selection(self):
+        # rifiltra mese e anno visualizzati mantenendo le righe selezionate:
+        # per le fatture conta la riga della tabella, non l'indice nella lista
+        # (le nuove scadenze possono finire prima di quella selezionata)
+        details = (
+            (self.clients_list.original_widget, lambda: (self.data_clients, self.all_sel_clients_data)),
+            (self.suppliers_list.original_widget, lambda: (self.data_suppliers, self.all_sel_suppliers_data)),
+        )
+        selected = [(self.scad_list, self.scad_list.selected_row, self.scad_list.selected_col, None)]
+        for box, current in details:
+            table, positions = current()
+            row = box.selected_row
+            position = positions[row] if 0 <= row < len(positions) else None
+            selected.append((box, row, box.selected_col, (table, position, current)))
+        self.select_invoice_month_year(control.widget_control.Event(
+            tipology="richiesta_filtro_scadenze",
+            source=self,
+            payload={"month": self.month_act, "year": self.year_act}
+        ))
+        for box, row, col, saved in selected:
+            if saved is not None:
+                row = self._row_index(*saved, row)
+            box.selected_row = min(row, max(0, len(box.content) - 1))
+            box.selected_col = col
+            if box.selection_mode == "row" and box.content:
+                box._safe_set_focus(box.selected_row + 1)
+            box._update_highlighting()
+
+    def _row_index(self, old_table, position, current, row):
+        # nuovo indice nella lista della riga selezionata prima del filtro; con
+        # la tabella sostituita (dati ricaricati) la riga si cerca per contenuto.
+        # Se la riga non c'è più resta l'indice precedente, limitato alla lista
+        if position is None:
+            return row
+        table, positions = current()
+        if table is old_table:
+            try:
+                return positions.index(position)
+            except ValueError:
+                return row
+        key = tuple(old_table[position])
+        for index, new_position in enumerate(positions):
+            if tuple(table[new_position]) == key:
+                return index
+        return row
+
     def show_current_focus(self, evento):
         payload = evento.payload or {}
         if payload.get("Info"):
@@ -193,14 +390,14 @@ class MainView(urwid.WidgetWrap):
     def show_clients_details(self, payload):
         selected_item = payload.get("data")
         try:
-            self._view_popup(self.all_sel_clients_data[selected_item], "C")
+            self._view_popup(self.data_clients[self.all_sel_clients_data[selected_item]], "C")
         except IndexError:
             pass
 
     def show_suppliers_details(self, payload):
         selected_item = payload.get("data")
         try:
-            self._view_popup(self.all_sel_suppliers_data[selected_item], "F")
+            self._view_popup(self.data_suppliers[self.all_sel_suppliers_data[selected_item]], "F")
         except IndexError:
             pass
 
@@ -221,10 +418,14 @@ class MainView(urwid.WidgetWrap):
             """
 
         try:
+            # entry: InvoiceRow della tabella, valori formattati con display()
+            values = [entry.display(col) for col in range(len(entry))]
             if widget_id == "F":
-                details = format_details("Fornitore", entry[0], entry[4], entry[1], entry[2], entry[3], entry[5], entry[6], entry[7])
+                details = format_details("Fornitore", values[0], values[4], values[1], values[2],
+                                         values[3], values[5], values[6], values[7])
             elif widget_id == "C":
-                details = format_details("Cliente", entry[8], entry[9], entry[1], entry[2], entry[3], entry[5], entry[6], entry[7])
+                details = format_details("Cliente", values[8], values[9], values[1], values[2],
+                                         values[3], values[5], values[6], values[7])
             else:
                 return
         except IndexError:
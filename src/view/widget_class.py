@@ -28,6 +28,7 @@ class ToolBar(urwid.WidgetWrap):
         self.start_path = None
         self.year_act = YearAct.YEAR_ACT
         self.index = 0
+        self._focus_emesso = False
 
         labels = [f"Anno: {self.year_act}", "Percorso dati", "Elabora fatture", "Esci"]
         button_widgets = []
@@ -100,10 +101,12 @@ class ToolBar(urwid.WidgetWrap):
         def on_path_selected(new_path):
             def close_popup(loop, user_data):
                 pop.close_popup()
-            # Salva il nuovo percorso nel file
+            # Salva il nuovo percorso nel file, mantenendo gli altri percorsi
+            # configurati in path.csv
+            suppliers, clients = self.controller.get_source_roots()
             success = self.controller.set_start_paths({
-                "suppliers": [new_path[0]],
-                "clients": [new_path[1]]
+                "suppliers": [new_path[0]] + suppliers[1:],
+                "clients": [new_path[1]] + clients[1:]
             })
             if success:
                 if not new_path or len(new_path) < 2:
@@ -137,8 +140,8 @@ class ToolBar(urwid.WidgetWrap):
         print("Chiusura con:", value)
 
     def handle_elaborate_invoice(self):
-        start_path = self.controller.get_start_paths()
-        if not start_path:
+        start_path = self.controller.get_source_roots()
+        if not all(start_path):
             event = control.widget_control.Event("text-statusbar", self, {
                 "Warning": "Percorso dati non trovato o incompleto. Seleziona prima 'Percorso dati'"
             })
@@ -159,9 +162,13 @@ class ToolBar(urwid.WidgetWrap):
             )
             event = control.widget_control.Event("text-statusbar", self, {tipology: message})
             self.controller.emit_event(event)
+            if confirmed and result:
+                # nuovi dati subito nelle liste, senza riavviare
+                self.controller.reload_data(self)
             self.app.loop.set_alarm_in(1.0, close_popup)
 
-        contab = MakeInvoiceCsv(start_path=start_path, on_close=on_compute_complete)
+        contab = MakeInvoiceCsv(start_path=start_path, on_close=on_compute_complete,
+                                app=self.app, controller=self.controller)
         pop.show_popup(head="Contabilizzazione", layout=contab)
 
     def handle_exit(self):
@@ -177,8 +184,9 @@ class ToolBar(urwid.WidgetWrap):
 
     def render(self, size, focus=False):
         # Override di render per gestire il focus;
-        # Evita di emettere l’event "text-statusbar" troppe volte al focus
-        if focus and not getattr(self, "_focus_emesso", False):
+        # Evita di emettere l’event "text-statusbar" troppe volte al focus:
+        # solo quando la toolbar prende il focus, non a ogni disegno
+        if focus and not self._focus_emesso:
             #self.controller.emit_event("text-statusbar", {"widget": self})
             event = control.widget_control.Event(
                 tipology="text-statusbar",
@@ -187,9 +195,12 @@ class ToolBar(urwid.WidgetWrap):
             )
             self.controller.emit_event(event)
             self._focus_emesso = True
-        elif not focus:
+            # il canvas in cache non va riusato al prossimo cambio di focus
+            self._invalidate()
+        elif not focus and self._focus_emesso:
             self._focus_emesso = False
-            
+            self._invalidate()
+
         return super().render(size, focus)
 
     def selectable(self):
@@ -266,11 +277,26 @@ class MakeListBox(urwid.WidgetWrap):
         self.year_act = YearAct.YEAR_ACT
         self.selected_row = 0
         self.selected_col = 0
-        self.widget_list = []
-
-        self.listbox = urwid.ListBox(urwid.SimpleFocusListWalker(self.widget_list))
-        self.list_linebox = urwid.LineBox(self.listbox, title=title)
-        super().__init__(self.list_linebox)
+        self.content = []        # righe visualizzate (dati, non widget)
+        self.num_columns = 0
+        self._highlighted = None  # (riga, colonna) evidenziate l'ultima volta
+
+        # walker virtuale: widget costruiti solo per le righe visibili
+        self.walker = RowWalker(self)
+        self.listbox = urwid.ListBox(self.walker)
+        # cornici con e senza focus, create una volta sola e scambiate in render
+        self._frames = {
+            True: urwid.AttrMap(
+                urwid.LineBox(self.listbox, title=title, title_attr='activeListBox'),
+                'activeLineBox'
+            ),
+            False: urwid.AttrMap(
+                urwid.LineBox(self.listbox, title=title, title_attr='normalListBox'),
+                'normal'
+            ),
+        }
+        self._has_focus = None  # focus dell'ultimo render
+        super().__init__(self._frames[False])
 
     def _log_focus_state(self, context=""):
         try:
@@ -293,21 +319,17 @@ class MakeListBox(urwid.WidgetWrap):
         head_widgets = [urwid.Text(label, align=align) for label, align in head]
         self.header_widget = urwid.AttrMap(urwid.Columns(head_widgets), 'header')
 
-        alignments = [a[1] for a in head]
-        self.content_widgets = [
-            RowColumns(row, alignments, parent=self, row_index=i)
-            for i, row in enumerate(content)
-        ]
-
-        self.widget_list = [self.header_widget] + self.content_widgets
-        self.listbox.body.clear()
-        self.listbox.body.extend(self.widget_list)
+        # le righe restano dati: RowWalker crea i widget quando la ListBox li chiede
+        self.content = content
+        self.num_columns = len(head)
+        self.walker.set_rows(self.header_widget, content, [a[1] for a in head])
+        self._highlighted = None  # widget nuovi: già costruiti con lo stile giusto
 
         self.selected_row = 0
         #self.selected_col = 0
 
         if self.selection_mode == "row":
-            self._safe_set_focus(self.selected_row + 1 if self.content_widgets else 0)
+            self._safe_set_focus(self.selected_row + 1 if self.content else 0)
         elif self.selection_mode == "col":
             self._safe_set_focus(0)
 
@@ -316,15 +338,33 @@ class MakeListBox(urwid.WidgetWrap):
     def update_year_active(self, new_year):
         self.year_act = new_year
 
+    def _cell_attr(self, i, j):
+        if self.selection_mode == "row" and i == self.selected_row:
+            return 'selected'
+        if self.selection_mode == "col" and j == self.selected_col:
+            return 'selected'
+        return 'normal'
+
     def _update_highlighting(self):
-        for i, row in enumerate(self.content_widgets):
-            for j, cell in enumerate(row.cells):
-                if self.selection_mode == "row" and i == self.selected_row:
-                    cell.set_attr_map({None: 'selected'})
-                elif self.selection_mode == "col" and j == self.selected_col:
-                    cell.set_attr_map({None: 'selected'})
-                else:
-                    cell.set_attr_map({None: 'normal'})
+        # ristila solo la riga (o la colonna) evidenziata prima e quella nuova;
+        # le righe senza widget prendono lo stile quando vengono costruite
+        previous, self._highlighted = self._highlighted, (self.selected_row, self.selected_col)
+        widgets = self.walker.widgets
+        if self.selection_mode == "row":
+            changed_rows = {self.selected_row}
+            if previous is not None:
+                changed_rows.add(previous[0])
+            for i in changed_rows:
+                row = widgets.get(i)
+                if row is not None:
+                    row.apply_highlighting()
+        elif self.selection_mode == "col":
+            changed_cols = {self.selected_col}
+            if previous is not None:
+                changed_cols.add(previous[1])
+            for row in widgets.values():
+                for j in changed_cols:
+                    row.set_cell_attr(j, self._cell_attr(row.row_index, j))
 
     def _select_row_by_mouse(self, index):
         self.selected_row = index
@@ -344,9 +384,8 @@ class MakeListBox(urwid.WidgetWrap):
 
     def _manage_move_column(self, key):
         step = 1 if key == 'right' else -1
-        if self.content_widgets:
-            num_columns = len(self.content_widgets[0].cells)
-            self.selected_col = (self.selected_col + step) % num_columns
+        if self.content:
+            self.selected_col = (self.selected_col + step) % self.num_columns
             self._update_highlighting()
 
         if self.selection_mode == "row":
@@ -360,7 +399,7 @@ class MakeListBox(urwid.WidgetWrap):
                     self.app.main.view.focus_position = 1
                 self.selected_row = max(0, self.selected_row - 1)
             elif key == 'down':
-                max_row = len(self.content_widgets) - 1
+                max_row = len(self.content) - 1
                 self.selected_row = min(max_row, self.selected_row + 1)
             self._safe_set_focus(self.selected_row + 1)
             self._update_highlighting()
@@ -396,31 +435,27 @@ class MakeListBox(urwid.WidgetWrap):
         self.controller.emit_event(event)
 
     def render(self, size, focus=False):
-        self._log_focus_state("render")
+        # righe visibili: il walker tiene i widget di questa finestra e del margine
+        self.walker.visible_rows = size[1] if len(size) > 1 else self.walker.visible_rows
+        focus = bool(focus)
         if focus:
             try:
                 self.listbox.get_focus()
             except IndexError:
                 self._safe_set_focus(0)
 
-            event = control.widget_control.Event(
-                tipology="text-statusbar",
-                source=self,
-                payload={"Messaggi": self}
-            )
-            self.controller.emit_event(event)
-
-            new_listbox = urwid.AttrMap(
-                urwid.LineBox(self.listbox, title=self.title, title_attr='activeListBox'),
-                'activeLineBox'
-            )
-        else:
-            new_listbox = urwid.AttrMap(
-                urwid.LineBox(self.listbox, title=self.title, title_attr='normalListBox'),
-                'normal'
-            )
-
-        self._w = new_listbox
+        if focus != self._has_focus:
+            # cambio di focus: cornice già pronta e messaggio nella status bar
+            # solo quando la lista prende il focus, non a ogni disegno
+            self._has_focus = focus
+            self._w = self._frames[focus]
+            if focus:
+                event = control.widget_control.Event(
+                    tipology="text-statusbar",
+                    source=self,
+                    payload={"Messaggi": self}
+                )
+                self.controller.emit_event(event)
         return super().render(size, focus)
 
 class Cell(urwid.Text):
@@ -436,9 +471,30 @@ class RowColumns(urwid.WidgetWrap):
         self.parent = parent
         self.row_index = row_index
         self.cells = self._create_cells(values, alignments)
+        self.attrs = ['normal'] * len(self.cells)  # stile applicato a ogni cella
 
         row_widget = urwid.Columns(self.cells)
         super().__init__(row_widget)
+        self.apply_highlighting()
+
+    def rebind(self, values, row_index):
+        """Riusa la riga per altri valori (stesso numero di colonne)."""
+        self.row_index = row_index
+        for cell, value in zip(self.cells, values):
+            cell.original_widget.set_text(str(value))
+        self.apply_highlighting()
+
+    def apply_highlighting(self):
+        if self.parent is None:
+            return
+        for j in range(len(self.cells)):
+            self.set_cell_attr(j, self.parent._cell_attr(self.row_index, j))
+
+    def set_cell_attr(self, j, attr):
+        # set_attr_map solo se lo stile cambia: evita di invalidare la cella
+        if j < len(self.cells) and self.attrs[j] != attr:
+            self.attrs[j] = attr
+            self.cells[j].set_attr_map({None: attr})
 
     def _create_cells(self, values, alignments):
         """Crea le celle con stile normal/selected."""
@@ -458,13 +514,112 @@ class RowColumns(urwid.WidgetWrap):
             return True
         return False
         
+class RowWalker(urwid.ListWalker):
+    """
+    ListWalker virtuale di MakeListBox: le righe restano dati (tuple o
+    DisplayRows) e i widget RowColumns vengono costruiti solo per le posizioni
+    chieste dalla ListBox, cioè la finestra visibile. I widget lontani dal
+    focus più di visible_rows + MARGIN righe tornano in un pool e vengono
+    riusati per altre righe, così il costo di refresh e scorrimento dipende
+    dall'altezza dello schermo e non dal numero di righe.
+    Posizione 0: intestazione; posizione i + 1: riga i.
+    """
+    MARGIN = 32
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.header = None
+        self.rows = []
+        self.alignments = []
+        self.focus = 0
+        self.visible_rows = 50
+        self.widgets = {}    # indice riga -> RowColumns costruita
+        self._pool = []      # RowColumns libere, da riusare
+
+    def set_rows(self, header, rows, alignments):
+        if len(alignments) != len(self.alignments):
+            self._pool = []  # numero di colonne diverso: widget non riusabili
+        else:
+            self._pool.extend(self.widgets.values())
+        self.widgets = {}
+        self.header, self.rows, self.alignments = header, rows, alignments
+        self.focus = 0
+        self._modified()
+
+    def __len__(self):
+        if self.header is None:
+            return 0
+        return len(self.rows) + 1
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        if position == 0:
+            return self.header
+        return self._row_widget(position - 1)
+
+    def _row_widget(self, row_index):
+        widget = self.widgets.get(row_index)
+        if widget is None:
+            self._trim()
+            values = self.rows[row_index]
+            if self._pool:
+                widget = self._pool.pop()
+                widget.rebind(values, row_index)
+            else:
+                widget = RowColumns(values, self.alignments, parent=self.parent, row_index=row_index)
+            self.widgets[row_index] = widget
+        return widget
+
+    def _trim(self):
+        # libera i widget fuori dalla finestra attorno al focus
+        radius = self.visible_rows + self.MARGIN
+        if len(self.widgets) <= 2 * radius:
+            return
+        center = self.focus - 1
+        for row_index in [i for i in self.widgets if abs(i - center) > radius]:
+            self._pool.append(self.widgets.pop(row_index))
+
+    def next_position(self, position):
+        if position + 1 >= len(self):
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position):
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def set_focus(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        self.focus = position
+        self._modified()
+
+    def positions(self, reverse=False):
+        if reverse:
+            return range(len(self) - 1, -1, -1)
+        return range(len(self))
+
 class MakeInvoiceCsv(urwid.WidgetWrap):
-    def __init__(self, start_path=".", on_close=None):
+    """
+    Conferma e avanzamento della contabilizzazione. La lettura delle fatture
+    gira in background nel loop di app (controller.start_ingest): la
+    finestra mostra file letti, velocità, tempo stimato ed errori, e il
+    bottone Annulla interrompe la lettura senza scrivere nulla.
+    """
+    def __init__(self, start_path, on_close, app, controller):
         self.on_close = on_close
         self.start_path = start_path
+        self.app = app
+        self.controller = controller
+        self.job = None
         text_info = urwid.LineBox(urwid.Text("Contabilizzare fatture XML presenti nei percorsi:", align='center'))
-        text_info_path_F = urwid.Text(f"Fornitori: {self.start_path[0]}", align='center')
-        text_info_path_C = urwid.Text(f"Clienti: {self.start_path[1]}", align='center')
+        paths_F, paths_C = (
+            "; ".join(paths) if isinstance(paths, list) else paths for paths in self.start_path
+        )
+        text_info_path_F = urwid.Text(f"Fornitori: {paths_F}", align='center')
+        text_info_path_C = urwid.Text(f"Clienti: {paths_C}", align='center')
         
         ok_btn = urwid.Button("Conferma contabilizzazione")
         ok_btn._label.align = 'center'
@@ -478,9 +633,7 @@ class MakeInvoiceCsv(urwid.WidgetWrap):
         styled_cancel_btn = urwid.AttrMap(cancel_btn, 'cancel_button', focus_map='cancel_button_focus')
         centered_ok_btn = urwid.Padding(styled_ok_btn, align='center', width=('relative', 50))
         centered_cancel_btn = urwid.Padding(styled_cancel_btn, align='center', width=('relative', 50))
-        
-        self.account_invoices = control.widget_control.AccountInvoices()
-        
+
         self.view = urwid.Filler(urwid.Pile([
             ('weight', 1, text_info),
             (urwid.Divider()),
@@ -495,21 +648,61 @@ class MakeInvoiceCsv(urwid.WidgetWrap):
         super().__init__(self.view)
         
     def confirm(self, button):
+        if self.job is not None:
+            return  # già avviata
+        self._w = self._build_progress_view()
+        self.job = self.controller.start_ingest(self.app.loop, self.start_path,
+                                                self.show_progress, self.on_ingest_done)
+
+    def _build_progress_view(self):
+        self.progress_text = urwid.Text("Ricerca delle fatture XML...", align='center')
+        cancel_btn = urwid.Button("Annulla elaborazione")
+        cancel_btn._label.align = 'center'
+        urwid.connect_signal(cancel_btn, 'click', self.cancel_ingest)
+        styled_cancel_btn = urwid.AttrMap(cancel_btn, 'cancel_button', focus_map='cancel_button_focus')
+        centered_cancel_btn = urwid.Padding(styled_cancel_btn, align='center', width=('relative', 50))
+        return urwid.Filler(urwid.Pile([
+            urwid.LineBox(urwid.Text("Contabilizzazione in corso", align='center')),
+            urwid.Divider(),
+            self.progress_text,
+            urwid.Divider(),
+            ('pack', centered_cancel_btn)
+        ]))
+
+    def show_progress(self, progress):
+        # progress: IngestProgress, ricevuto nel loop di urwid
+        if self.job is not None and self.job.cancel_event.is_set():
+            return
+        if not progress.total:
+            self.progress_text.set_text(f"{progress.stage} in corso...\nErrori: {progress.errors}")
+            return
+        eta = progress.eta
+        eta_text = f"{eta:.0f} s" if eta is not None else "-"
+        self.progress_text.set_text(
+            f"{progress.stage}: {progress.done}/{progress.total} file\n"
+            f"{progress.rate:.1f} file/s, tempo stimato {eta_text}\n"
+            f"Errori: {progress.errors}"
+        )
+
+    def cancel_ingest(self, button):
+        if self.job is not None:
+            self.job.cancel()
+            self.progress_text.set_text("Annullamento in corso...")
+
+    def on_ingest_done(self, result, cancelled, messages):
+        self.job = None
+        if messages and not cancelled:
+            self.progress_text.set_text(messages[-1])  # es. l'errore che ha fermato la lettura
         if self.on_close:
-            result = self.make_csv()
-            self.on_close(True, result)  # True = utente ha confirmed
+            if cancelled:
+                self.on_close(False, None)  # annullata: nessun file modificato
+            else:
+                self.on_close(True, result)
 
     def cancel(self, button):
         if self.on_close:
             self.on_close(False, None)  # False = utente ha annullato
 
-    def make_csv(self):
-        try:
-            self.account_invoices.make_csv(self.start_path)
-            return True
-        except:
-            return False
-
 class DirectorySelector(urwid.WidgetWrap):
     def __init__(self, start_path=".", on_close=None):
         try:
@@ -619,25 +812,40 @@ class DirectorySelector(urwid.WidgetWrap):
 
 class MakeStatusBar(urwid.WidgetWrap):
     """
-    Barra di stato a riga singola, con testo dinamico
+    Barra di stato a riga singola, con testo dinamico. I messaggi sono
+    applicati al disegno successivo: più aggiornamenti nello stesso frame
+    costano un solo cambio di testo e stile, sugli stessi widget.
     """
+    COLOR_MAP = {
+        "Info": "status_text_black",
+        "Warning": "status_text_red",
+        "error": "status_text_blue"
+    }
+
     def __init__(self):
         self.text = urwid.Text("", align='left')  # o 'center' o 'right' se preferisci
 
         # Applica uno stile
-        styled_text = urwid.AttrMap(self.text, "status_text_black")
+        self.style = "status_text_black"
+        self.styled_text = urwid.AttrMap(self.text, self.style)
+        self._pending = None  # (messaggio, stile) da mostrare al prossimo render
 
         # Layout semplice: una riga
-        filler = urwid.Filler(styled_text, valign='top')
+        filler = urwid.Filler(self.styled_text, valign='top')
 
         super().__init__(filler)
 
     def update_status(self, message="", level="Info"):
-        color_map = {
-            "Info": "status_text_black",
-            "Warning": "status_text_red",
-            "error": "status_text_blue"
-        }
-        style = color_map.get(level)
-        self._w = urwid.Filler(urwid.AttrMap(self.text, style))
-        self.text.set_text(message)
\ No newline at end of file
+        self._pending = (message, self.COLOR_MAP.get(level))
+        self._invalidate()
+
+    def render(self, size, focus=False):
+        if self._pending is not None:
+            message, style = self._pending
+            self._pending = None
+            if style != self.style:
+                self.style = style
+                self.styled_text.set_attr_map({None: style})
+            if message != self.text.text:
+                self.text.set_text(message)
+        return super().render(size, focus)